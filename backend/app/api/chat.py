@@ -1,5 +1,9 @@
 # backend/app/api/chat.py
+import json
+import logging
+
 from app.api.deps import get_current_user
+from app.core.metrics import TimedRoute
 from app.models.chat import (
     ChatMessageResponse,
     ChatRequest,
@@ -7,27 +11,162 @@ from app.models.chat import (
     StartSessionResponse,
 )
 from app.services.agent_logic import get_intro_reply
-from app.services.agents.router import run_agent
-from app.services.session_store import SessionStore
-from app.services.supabase_client import supabase
-from app.services.supabase_logs import fetch_logs
+from app.services.agents.router import (
+    arun_agent,
+    astream_agent,
+    register_context,
+    run_agent,
+)
+from app.services.background import spawn
+from app.services.context_window import build_window, summary_folder
+from app.services.prompt_usage import prompt_usage
+from app.services.provider_router import ProvidersUnavailable, provider_router
+from app.services.reply_cache import reply_cache
+from app.services.session_cache import session_cache
+from app.services.session_store import AsyncSessionStore, SessionStore
+from app.services.supabase_client import db_stats
+from app.services.supabase_logs import afetch_logs, invalidate_logs
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 
-router = APIRouter(prefix="/chat", tags=["chat"])
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/chat", tags=["chat"], route_class=TimedRoute)
 
 
 @router.post("/session", response_model=StartSessionResponse)
-def start_session(data: StartSessionRequest, uid: str = Depends(get_current_user)):
+async def start_session(
+    data: StartSessionRequest, uid: str = Depends(get_current_user)
+):
     if data.user_id != uid:
         raise HTTPException(status_code=403, detail="User mismatch")
 
-    logs = fetch_logs(uid)
-    sid = SessionStore.create(uid, logs)
+    logs = await afetch_logs(uid)
+    sid = await AsyncSessionStore.create(uid, logs)
+    spawn(_register_context(uid, sid))
     return {"session_id": sid, "reply": get_intro_reply(logs)}
 
 
+async def _register_context(uid: str, sid: str) -> None:
+    """Cache the session context provider-side while the intro is being read."""
+    sess = await AsyncSessionStore.get(uid, sid)
+    if sess and (handle := await register_context(sess["digest"])):
+        await AsyncSessionStore.set_context_cache(uid, sid, handle)
+
+
+@router.delete("/logs/cache", status_code=204)
+async def invalidate_logs_cache(uid: str = Depends(get_current_user)):
+    """Called by the frontend after it writes a study/sleep/mood log."""
+    invalidate_logs(uid)
+
+
 @router.post("/message", response_model=ChatMessageResponse)
-def send_message(payload: ChatRequest, uid: str = Depends(get_current_user)):
+async def send_message(payload: ChatRequest, uid: str = Depends(get_current_user)):
+    if payload.user_id != uid:
+        raise HTTPException(status_code=403, detail="User mismatch")
+
+    sess = await AsyncSessionStore.get(uid, payload.session_id)
+    if not sess:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    turns, summary = build_window(sess, payload.model)
+    try:
+        reply = await arun_agent(
+            payload.model,
+            sess["digest"],
+            turns,
+            payload.message,
+            summary=summary,
+            use_cache=payload.use_cache,
+            context_cache=sess.get("context_cache"),
+        )
+    except ProvidersUnavailable as e:
+        logger.warning(
+            "providers unavailable", extra={"model": payload.model, "error": str(e)}
+        )
+        raise HTTPException(status_code=503, detail="No agent is available right now")
+    # Both turns in one write-through, flushed after the response is sent.
+    await AsyncSessionStore.append_many(
+        uid,
+        payload.session_id,
+        [
+            {"role": "user", "content": payload.message},
+            {"role": "assistant", "content": reply},
+        ],
+        background=True,
+    )
+    spawn(summary_folder.maintain(uid, payload.session_id, payload.model))
+    return {"reply": reply, "history": sess["history"]}
+
+
+def _sse(data: dict, event: str | None = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+
+@router.post("/message/stream")
+async def stream_message(payload: ChatRequest, uid: str = Depends(get_current_user)):
+    """
+    Server-Sent Events variant of /message.
+    Emits `data: {"token": ...}` per chunk, then `event: done` with the full reply.
+    The assembled reply is persisted once the stream ends or the client disconnects.
+    """
+    if payload.user_id != uid:
+        raise HTTPException(status_code=403, detail="User mismatch")
+
+    sess = await AsyncSessionStore.get(uid, payload.session_id)
+    if not sess:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    turns, summary = build_window(sess, payload.model)
+    tokens = astream_agent(
+        payload.model,
+        sess["digest"],
+        turns,
+        payload.message,
+        summary=summary,
+        use_cache=payload.use_cache,
+        context_cache=sess.get("context_cache"),
+    )
+
+    async def events():
+        parts: list[str] = []
+        try:
+            async for token in tokens:
+                parts.append(token)
+                yield _sse({"token": token})
+            reply = "".join(parts).strip() or "Sorry, no reply was generated."
+            yield _sse({"reply": reply}, event="done")
+        except Exception:
+            logger.exception("chat stream failed", extra={"model": payload.model})
+            yield _sse({"detail": "Agent failed while streaming."}, event="error")
+        finally:
+            # Runs on normal completion and on disconnect (generator closed);
+            # detached so a cancelled request can't abort the write.
+            new_turns = [{"role": "user", "content": payload.message}]
+            reply = "".join(parts).strip()
+            if reply:
+                new_turns.append({"role": "assistant", "content": reply})
+            spawn(_persist_turns(uid, payload.session_id, payload.model, new_turns))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _persist_turns(uid: str, sid: str, model: str, turns: list) -> None:
+    await AsyncSessionStore.append_many(uid, sid, turns)
+    await summary_folder.maintain(uid, sid, model)
+
+
+@router.post("/message/sync", response_model=ChatMessageResponse)
+def send_message_sync(payload: ChatRequest, uid: str = Depends(get_current_user)):
+    """
+    Blocking variant of /message (threadpool + sync clients), kept so the two
+    stacks can be benchmarked side by side.
+    """
     if payload.user_id != uid:
         raise HTTPException(status_code=403, detail="User mismatch")
 
@@ -35,47 +174,69 @@ def send_message(payload: ChatRequest, uid: str = Depends(get_current_user)):
     if not sess:
         raise HTTPException(status_code=404, detail="Session not found")
 
+    turns, summary = build_window(sess, payload.model)
+    try:
+        reply = run_agent(
+            payload.model, sess["digest"], turns, payload.message, summary
+        )
+    except ProvidersUnavailable as e:
+        logger.warning(
+            "providers unavailable", extra={"model": payload.model, "error": str(e)}
+        )
+        raise HTTPException(status_code=503, detail="No agent is available right now")
     SessionStore.append(uid, payload.session_id, "user", payload.message)
-    reply = run_agent(payload.model, sess["logs"], sess["history"], payload.message)
     SessionStore.append(uid, payload.session_id, "assistant", reply)
     return {"reply": reply, "history": sess["history"]}
 
 
 @router.get("/session/exists")
-def session_exists(uid: str = Depends(get_current_user)):
-    res = (
-        supabase.table("chat_sessions")
-        .select("session_id")
-        .eq("user_id", uid)
-        .single()
-        .execute()
-    )
-    return {"session_id": res.data["session_id"] if res and res.data else None}
+async def session_exists(uid: str = Depends(get_current_user)):
+    return {"session_id": await AsyncSessionStore.exists(uid)}
 
 
 @router.get("/session/full")
-def get_full_session(uid: str = Depends(get_current_user)):
-    res = (
-        supabase.table("chat_sessions")
-        .select("session_id,logs,history")
-        .eq("user_id", uid)
-        .single()
-        .execute()
-    )
-    if not res or not res.data:
+async def get_full_session(uid: str = Depends(get_current_user)):
+    sid = await AsyncSessionStore.exists(uid)
+    if not sid:
+        return {"session_id": None, "logs": None, "history": None}
+
+    sess = await AsyncSessionStore.get(uid, sid)
+    if not sess:
         return {"session_id": None, "logs": None, "history": None}
+    return {"session_id": sid, "logs": sess["logs"], "history": sess["history"]}
+
+
+@router.get("/cache/stats")
+def session_cache_stats(uid: str = Depends(get_current_user)):
+    """Hit/miss/eviction counters of this worker's session cache."""
+    return session_cache.stats()
+
+
+@router.get("/reply-cache/stats")
+def reply_cache_stats(uid: str = Depends(get_current_user)):
+    """Per-provider hit ratio and provider latency saved by the reply cache."""
+    return reply_cache.stats()
+
+
+@router.get("/context/stats")
+def context_window_stats(uid: str = Depends(get_current_user)):
+    """History budgets per model and how many turns were folded into summaries."""
+    return summary_folder.stats()
+
+
+@router.get("/prompt-cache/stats")
+def prompt_cache_stats(uid: str = Depends(get_current_user)):
+    """Prompt tokens per provider and the share served from the provider's cache."""
+    return prompt_usage.stats()
+
+
+@router.get("/providers/stats")
+def provider_stats(uid: str = Depends(get_current_user)):
+    """Breaker states, per-workload p50/p95 and hedge/fallback counts of the LLM router."""
+    return provider_router.stats()
+
 
-    import json
-
-    data = res.data
-    return {
-        "session_id": data["session_id"],
-        "logs": (
-            data["logs"] if isinstance(data["logs"], dict) else json.loads(data["logs"])
-        ),
-        "history": (
-            data["history"]
-            if isinstance(data["history"], list)
-            else json.loads(data["history"])
-        ),
-    }
+@router.get("/db/stats")
+def db_pool_stats(uid: str = Depends(get_current_user)):
+    """Requests, new connections per 1k requests, retries and timeouts of the data client."""
+    return db_stats()
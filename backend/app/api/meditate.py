@@ -1,23 +1,49 @@
 # backend/app/api/meditate.py
+import logging
+import re
+from email.utils import formatdate, parsedate_to_datetime
 from pathlib import Path
+from urllib.parse import quote
 from uuid import uuid4
 
 from app.api.deps import get_current_user
+from app.core.config import settings
+from app.core.metrics import TimedRoute
+from app.services import bg_cache
+from app.services.audio_pool import PoolBusy, mix_pool
+from app.services.audio_retention import audio_retention
 from app.services.meditation import (
+    cache_key,
+    cached_meditation,
     generate_meditation_prompt,
     generate_transcript,
-    mix_with_bg,
-    store_meditation,
-    tts_to_wav,
+    render_meditation,
+    stream_meditation,
 )
-from app.services.supabase_client import supabase
-from fastapi import APIRouter, Depends, Form, HTTPException, UploadFile
-from fastapi.responses import StreamingResponse
+from app.services.meditation_cache import meditation_cache
+from app.services.meditation_jobs import QueueFull, meditation_jobs
+from app.services.supabase_client import execute, get_async_supabase
+from app.services.supabase_logs import afetch_logs
+from fastapi import (
+    APIRouter,
+    Depends,
+    Form,
+    HTTPException,
+    Request,
+    Response,
+    UploadFile,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+
+logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/meditate", tags=["meditation"])
+router = APIRouter(prefix="/meditate", tags=["meditation"], route_class=TimedRoute)
 
-OUTPUT_DIR = Path("generated_audios")
-OUTPUT_DIR.mkdir(exist_ok=True)
+# Streamed renders, cached meditations and downloads share one directory.
+OUTPUT_DIR = Path(settings.AUDIO_DIR)
+OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+SAFE_FILENAME = re.compile(r"[A-Za-z0-9_-]+\.mp3")
 BG_PATH = Path(__file__).parent.parent / "background.mp3"
 
 AUDIO_MAP = {
@@ -36,67 +62,209 @@ async def create(
     user_id: str = Form(...),
     uid: str = Depends(get_current_user),
 ):
-    # print("DEBUG: User verification step")
     if user_id != uid:
-        print(f"DEBUG: User mismatch: form user_id={user_id}, token uid={uid}")
+        logger.warning("user mismatch", extra={"form_user_id": user_id, "uid": uid})
         raise HTTPException(403, "User mismatch")
-    # print(f"DEBUG: User verified: {uid}")
-    # print(f"DEBUG: Generating transcript for prompt: {prompt}")
-    transcript = generate_transcript(prompt)
-    # print(f"DEBUG: Transcript generated: {transcript[:60]}...")
-    # print("DEBUG: Generating TTS audio")
-    wav = await tts_to_wav(transcript)
-    # print("DEBUG: TTS audio generated")
     bg_path = AUDIO_MAP.get(background, DEFAULT_BG)
-    # print(f"DEBUG: Selected background: {background}, path: {bg_path}")
-    mp3 = mix_with_bg(wav, bg_path)
-    # print("DEBUG: Mixed with background audio")
-    # print("DEBUG: Uploading to Supabase Storage and inserting DB row")
-    audio_url = await store_meditation(user_id, transcript, mp3)
-    # print(f"DEBUG: Stored in Supabase, audio_url: {audio_url}")
-    return {"transcript": transcript, "audioUrl": audio_url}
-
-
-@router.get("/download/{filename}")
-def download(filename: str):
-    path = OUTPUT_DIR / filename
-    if not path.exists():
-        raise HTTPException(404, "File not found")
+    try:
+        return await render_meditation(user_id, prompt, bg_path)
+    except PoolBusy:
+        raise HTTPException(503, "Audio mixing is at capacity, try again shortly")
+
+
+@router.post("/stream")
+async def create_stream(
+    prompt: str = Form(...),
+    background: str = Form("flowing_focus"),
+    user_id: str = Form(...),
+    uid: str = Depends(get_current_user),
+):
+    """
+    Like POST /meditate/, but streams the MP3 while it is being rendered.
+    The transcript and the local file name come back as headers; the file is
+    uploaded to storage (and listed in /meditate/list) once rendering ends.
+    A client that hangs up early cancels the render; a render that fails
+    mid-stream aborts the response rather than ending it cleanly.
+    """
+    if user_id != uid:
+        raise HTTPException(403, "User mismatch")
+    bg_path = AUDIO_MAP.get(background, DEFAULT_BG)
+    hit = await cached_meditation(uid, prompt, bg_path)
+    if hit is not None:
+        return FileResponse(
+            hit["path"],
+            media_type="audio/mpeg",
+            headers={
+                "X-Transcript": quote(hit["transcript"]),
+                "X-Audio-File": hit["path"].name,
+                "Cache-Control": "no-store",
+            },
+        )
+
+    transcript = await generate_transcript(prompt)
+    fname = f"{uuid4().hex}.mp3"
     return StreamingResponse(
-        open(path, "rb"),
+        stream_meditation(
+            uid, transcript, bg_path, OUTPUT_DIR / fname, cache_key(prompt, bg_path)
+        ),
+        media_type="audio/mpeg",
+        headers={
+            "X-Transcript": quote(transcript),
+            "X-Audio-File": fname,
+            "Cache-Control": "no-store",
+        },
+    )
+
+
+@router.post("/jobs", status_code=202)
+async def submit_job(
+    prompt: str = Form(...),
+    background: str = Form("flowing_focus"),
+    user_id: str = Form(...),
+    uid: str = Depends(get_current_user),
+):
+    """Queue a meditation render; poll GET /meditate/jobs/{job_id} for progress."""
+    if user_id != uid:
+        raise HTTPException(403, "User mismatch")
+    bg_path = AUDIO_MAP.get(background, DEFAULT_BG)
+    try:
+        job_id = await meditation_jobs.submit(uid, prompt, bg_path)
+    except QueueFull:
+        raise HTTPException(503, "Meditation queue is full, try again shortly")
+    return {"job_id": job_id, "status": "queued"}
+
+
+@router.get("/jobs/stats")
+def job_stats(uid: str = Depends(get_current_user)):
+    """Queue depth, worker usage and per-stage timings, plus the mix pool."""
+    return {**meditation_jobs.stats(), "mix_pool": mix_pool.stats()}
+
+
+@router.get("/bg-cache")
+def bg_cache_report(uid: str = Depends(get_current_user)):
+    """Decoded size of each background track (memory cost of the cache)."""
+    return bg_cache.report(AUDIO_MAP.values(), settings.BG_CACHE_DIR)
+
+
+@router.get("/cache")
+def cache_stats(uid: str = Depends(get_current_user)):
+    """Meditation cache hit ratio, size and what it has saved."""
+    return meditation_cache.stats()
+
+
+@router.get("/storage")
+def storage_stats(uid: str = Depends(get_current_user)):
+    """Disk usage of generated audio and what retention has evicted."""
+    return audio_retention.stats()
+
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str, uid: str = Depends(get_current_user)):
+    job = await meditation_jobs.get(job_id)
+    if not job or job["user_id"] != uid:
+        raise HTTPException(404, "Job not found")
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "durations": job["durations"],
+        "transcript": job["transcript"],
+        "audioUrl": job["audio_url"],
+        "error": job["error"],
+    }
+
+
+@router.api_route("/download/{filename}", methods=["GET", "HEAD"])
+def download(filename: str, request: Request):
+    """
+    Serve a generated MP3. Range requests get 206 partial content (players
+    seek without refetching), conditional requests get 304 against the
+    ETag / Last-Modified, and full responses go out via the server's
+    sendfile path when it supports one.
+    """
+    path = _output_file(filename)
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        raise HTTPException(404, "File not found")
+
+    # Strong validator: files are written once (tmp + rename) and never
+    # modified in place, so size + mtime_ns pins the exact bytes.
+    headers = {
+        "ETag": f'"{st.st_size:x}-{st.st_mtime_ns:x}"',
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": "public, max-age=86400",
+    }
+    audio_retention.touch(path)
+    if _not_modified(request, headers["ETag"], st.st_mtime):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(
+        path,
         media_type="audio/mpeg",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        filename=filename,
+        headers=headers,
+        stat_result=st,
     )
 
 
+def _output_file(filename: str) -> Path:
+    """Resolve `filename` inside OUTPUT_DIR, rejecting anything that could escape it."""
+    if not SAFE_FILENAME.fullmatch(filename):
+        raise HTTPException(404, "File not found")
+    path = (OUTPUT_DIR / filename).resolve()
+    if path.parent != OUTPUT_DIR.resolve():
+        raise HTTPException(404, "File not found")
+    return path
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison (RFC 9110 13.1.2); takes precedence over If-Modified-Since.
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
 @router.get("/list")
-def list_meditations(uid: str = Depends(get_current_user)):
-    res = (
-        supabase.table("meditations")
+async def list_meditations(uid: str = Depends(get_current_user)):
+    db = await get_async_supabase()
+    res = await execute(
+        db.table("meditations")
         .select("id, transcript, audio_url, created_at")
         .eq("user_id", uid)
         .order("created_at", desc=True)
-        .execute()
     )
     meditations = res.data if hasattr(res, "data") else []
     return {"meditations": meditations}
 
 
 @router.get("/prompt")
-def get_meditation_prompt(uid: str = Depends(get_current_user)):
-    # Fetch last three mood logs for the user from Supabase
-    logs_res = (
-        supabase.table("mood_logs")
-        .select("score, note, at")
-        .eq("user_id", uid)
-        .order("at", desc=True)
-        .limit(3)
-        .execute()
-    )
-    logs = logs_res.data if hasattr(logs_res, "data") else []
+async def get_meditation_prompt(uid: str = Depends(get_current_user)):
+    # Last three mood logs, newest first; usually served from the logs cache
+    # warmed by /chat/session.
+    logs = (await afetch_logs(uid))["mood"][:3]
+    if not logs:
+        # Nothing in the last 15 days: fall back to the user's latest entries.
+        db = await get_async_supabase()
+        logs_res = await execute(
+            db.table("mood_logs")
+            .select("score, note, at")
+            .eq("user_id", uid)
+            .order("at", desc=True)
+            .limit(3)
+        )
+        logs = logs_res.data if hasattr(logs_res, "data") else []
     # Format logs as a string for the prompt generator
     logs_str = "; ".join(
         [f"score: {l.get('score')}, note: {l.get('note', '')}" for l in logs]
     )
-    prompt = generate_meditation_prompt(logs_str)
+    prompt = await run_in_threadpool(generate_meditation_prompt, logs_str)
     return {"prompt": prompt}
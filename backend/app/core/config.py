@@ -20,6 +20,14 @@ class Settings(BaseSettings):
     SUPABASE_URL: str
     SUPABASE_SERVICE_KEY: str
     SUPABASE_JWT_SECRET: str
+    SUPABASE_MAX_CONNECTIONS: int = 20  # shared async client pool
+    SUPABASE_MAX_KEEPALIVE: int = 10  # idle connections kept open
+    SUPABASE_KEEPALIVE_EXPIRY: float = 30.0  # seconds an idle connection is kept
+    SUPABASE_HTTP2: bool = False  # needs the optional `h2` package
+    SUPABASE_CONNECT_TIMEOUT: float = 5.0
+    SUPABASE_TIMEOUT: float = 10.0  # per query, see supabase_client.execute
+    SUPABASE_RETRIES: int = 2  # reads only; writes are never retried
+    SUPABASE_RETRY_BACKOFF: float = 0.2  # seconds, doubled per attempt
 
     # -------- LLMs --------------
     OPENAI_API_KEY: Optional[str] = None
@@ -31,6 +39,89 @@ class Settings(BaseSettings):
     )
     DEV_FAKE_UID: Optional[str] = None
 
+    # -------- Logging -----------
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True  # one JSON object per line; False -> plain text
+    LOG_QUEUE_SIZE: int = 10_000  # records awaiting the writer thread; more are dropped
+    LOG_MAX_FIELD_CHARS: int = 2000  # longer messages / extra fields are truncated
+    LOG_SAMPLING: dict[str, float] = {  # logger -> share of DEBUG/INFO records kept
+        "app.services.agents": 0.1,
+    }
+
+    # -------- Session cache -----
+    SESSION_CACHE_MAXSIZE: int = 1024  # sessions kept in memory per worker
+    SESSION_CACHE_TTL: float = 900.0  # seconds before a cached session is re-read
+    LOGS_CACHE_TTL: float = 120.0  # seconds a user's fetched logs are reused
+    LOGS_CACHE_MAXSIZE: int = 1024  # users whose logs are kept per worker
+    AUTH_CACHE_MAXSIZE: int = 4096  # verified access tokens kept per worker
+    AUTH_CACHE_TTL: float = 60.0  # seconds a verification is trusted (< token exp)
+
+    # -------- Reply cache -------
+    REPLY_CACHE_ENABLED: bool = True  # requests can still opt out (use_cache)
+    REPLY_CACHE_MAXSIZE: int = 2048  # cached chat replies per worker
+    REPLY_CACHE_TTL: float = 1800.0  # seconds a cached reply is reused
+    REPLY_CACHE_HISTORY_TURNS: int = 6  # newest turns of the prompt window in the key
+
+    # -------- History window ----
+    CHAT_HISTORY_BUDGET: dict[str, int] = {"openai": 2000, "gemini": 4000}  # tokens
+    CHAT_HISTORY_DEFAULT_BUDGET: int = 2000  # tokens, for models not listed above
+    CHAT_SUMMARY_MIN_TURNS: int = 2  # fold into the summary once this many dropped out
+    CHAT_HISTORY_LOAD_TURNS: int = 200  # newest turns read when a session is loaded
+    CHAT_MIGRATION_LEASE: float = 60.0  # seconds before a blob migration claim lapses
+
+    # -------- Context caching ---
+    GEMINI_CONTEXT_CACHE: bool = True  # register session context as cached content
+    GEMINI_CACHE_MIN_TOKENS: int = 1024  # Gemini's minimum cacheable size
+    GEMINI_CACHE_TTL: float = 3600.0  # seconds a session's cached content lives
+    GEMINI_CACHE_MARGIN: float = 60.0  # stop using a handle this close to expiry
+
+    # -------- Provider routing --
+    ROUTER_WINDOW: int = 200  # latency samples kept per workload/provider
+    ROUTER_HEDGE: bool = False  # start the 2nd provider once the 1st passes its p95
+    ROUTER_HEDGE_MIN_SAMPLES: int = 20  # samples needed before hedging
+    ROUTER_BREAKER_FAILURES: int = 5  # consecutive failures that open a breaker
+    ROUTER_BREAKER_ERROR_RATE: float = 0.5  # ...or this error rate over the window
+    ROUTER_BREAKER_WINDOW: int = 20  # recent calls the error rate is taken over
+    ROUTER_BREAKER_COOLDOWN: float = 30.0  # seconds before a probe is let through
+
+    # -------- Meditation jobs ---
+    MEDITATION_WORKERS: int = 2  # concurrent pipeline runs per process
+    MEDITATION_QUEUE_SIZE: int = 32  # queued jobs before submissions get 503
+    MEDITATION_JOBS_DB: str = "meditation_jobs.sqlite3"  # local persistent queue
+    MEDITATION_JOB_LEASE: float = 60.0  # seconds a claim lasts without renewal
+    MEDITATION_JOB_MAX_ATTEMPTS: int = 3  # claims before a job is marked failed
+
+    # -------- Audio mixing ------
+    MIX_WORKERS: int = 0  # mixing processes; 0 = one per CPU core
+    MIX_QUEUE_SIZE: int = 16  # mixes allowed to wait for a free process
+    BG_CACHE_DIR: str = ".bg_cache"  # decoded background PCM (memory-mapped)
+    BG_CACHE_WARM: bool = True  # decode all background tracks at startup
+
+    # -------- Text-to-speech ----
+    TTS_CONCURRENCY: int = 4  # script segments synthesized at once per meditation
+    TTS_PAUSE_MS: int = 2000  # silence inserted for each [pause] marker
+    TTS_SENTENCE_GAP_MS: int = 300  # silence between sentences of one passage
+
+    # -------- Generated audio ---
+    AUDIO_DIR: str = "generated_audios"  # streamed renders, cache, downloads, retention
+
+    # -------- Meditation cache --
+    MEDITATION_CACHE_BYTES: int = 512 * 1024 * 1024  # LRU-evicted above this
+
+    # -------- Audio retention ---
+    AUDIO_RETENTION_BYTES: int = 2 * 1024 * 1024 * 1024  # LRU-evicted above this
+    AUDIO_RETENTION_MAX_AGE: float = 7 * 24 * 3600.0  # seconds since written
+    AUDIO_RETENTION_INTERVAL: float = 300.0  # seconds between sweeps
+
+    # -------- Storage uploads ---
+    STORAGE_URL: Optional[str] = (
+        None  # default {SUPABASE_URL}/storage/v1; local stand-in
+    )
+    STORAGE_TUS_THRESHOLD: int = 6 * 1024 * 1024  # larger files use resumable upload
+    STORAGE_CHUNK_BYTES: int = 6 * 1024 * 1024  # TUS chunk (Supabase requires 6 MB)
+    STORAGE_UPLOAD_RETRIES: int = 3  # per chunk, resuming from the server's offset
+    STORAGE_TIMEOUT: float = 60.0
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,23 +1,188 @@
+# backend/app/core/logging.py
+"""
+Structured, non-blocking logging.
+
+Loggers only enqueue records (QueueHandler); a QueueListener thread formats
+them as one JSON object per line and writes them to stderr, so a slow
+terminal or log shipper never stalls a request. On the caller's side a
+record is
+
+  * sampled: below WARNING, loggers listed in LOG_SAMPLING (or under one of
+    them) keep only that share of their records, for chatty debug events;
+  * resolved and truncated: the message and every `extra` field (lists and
+    dicts by their JSON encoding) are cut to LOG_MAX_FIELD_CHARS, so a
+    prompt or payload can't bloat the queue or the line;
+  * dropped if the queue is full (LOG_QUEUE_SIZE) rather than waited on.
+
+Fields passed as `extra={...}` become top-level keys of the JSON line:
+
+    logger.info("meditation stored", extra={"user_id": uid, "bytes": n})
+"""
+
+import atexit
+import copy
+import json
 import logging
-from logging.config import dictConfig
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
 
+from app.core.config import settings
 
-def setup_logging() -> None:
-    dictConfig(
-        {
-            "version": 1,
-            "formatters": {
-                "default": {"format": "%(levelname)s | %(name)s | %(message)s"}
-            },
-            "handlers": {
-                "default": {
-                    "class": "logging.StreamHandler",
-                    "formatter": "default",
-                }
-            },
-            "root": {"handlers": ["default"], "level": "INFO"},
+# Attributes every LogRecord has; anything else came in through `extra`.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def _truncate(value: str, limit: int) -> str:
+    if len(value) <= limit:
+        return value
+    return f"{value[:limit]}... [{len(value) - limit} more chars]"
+
+
+def _truncate_field(value, limit: int):
+    """Strings and small values pass through; anything whose JSON is too long
+    becomes its truncated encoding."""
+    if isinstance(value, str):
+        return _truncate(value, limit)
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    try:
+        encoded = json.dumps(value, default=str, ensure_ascii=False)
+    except (TypeError, ValueError):
+        encoded = repr(value)
+    return value if len(encoded) <= limit else _truncate(encoded, limit)
+
+
+class SampleFilter(logging.Filter):
+    """Keeps a share of each listed logger's records below WARNING."""
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: dict[str, float] = {}  # logger name -> inherited rate
+
+    def rate(self, name: str) -> float:
+        if name not in self._resolved:
+            parts = name.split(".")
+            self._resolved[name] = next(
+                (
+                    self.rates[prefix]
+                    for prefix in (
+                        ".".join(parts[:i]) for i in range(len(parts), 0, -1)
+                    )
+                    if prefix in self.rates
+                ),
+                1.0,
+            )
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class AsyncQueueHandler(QueueHandler):
+    """
+    Enqueues a resolved, truncated copy of the record without blocking;
+    formatting and I/O happen on the listener thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue, max_chars: int):
+        super().__init__(log_queue)
+        self.max_chars = max_chars
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Resolve %-args and tracebacks now: they may reference objects that
+        # change (or can't be pickled) by the time the listener gets to them.
+        record.msg = _truncate(record.getMessage(), self.max_chars)
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        for key, value in list(vars(record).items()):
+            if key not in _RECORD_ATTRS:
+                setattr(record, key, _truncate_field(value, self.max_chars))
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
         }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                line[key] = value
+        if record.exc_text:
+            line["exc"] = record.exc_text
+        return json.dumps(line, default=str, ensure_ascii=False)
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)  # shutdown only: wait for room
+
+
+_listener: QueueListener | None = None
+
+
+def setup_logging() -> None:
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(
+        JsonFormatter()
+        if settings.LOG_JSON
+        else logging.Formatter("%(levelname)s | %(name)s | %(message)s")
     )
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    handler = AsyncQueueHandler(log_queue, settings.LOG_MAX_FIELD_CHARS)
+    handler.addFilter(SampleFilter(settings.LOG_SAMPLING))
+
+    # Added alongside whatever the host (uvicorn, a test runner) configured.
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL)
+
+    _listener = _Listener(log_queue, stream)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush what's queued and stop the writer thread (idempotent)."""
+    global _listener
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, AsyncQueueHandler):
+            if handler.dropped:
+                logging.getLogger(__name__).warning(
+                    "log records dropped (queue full)",
+                    extra={"dropped": handler.dropped},
+                )
+            root.removeHandler(handler)
+    _listener.stop()
+    _listener = None
 
 
 setup_logging()
@@ -0,0 +1,146 @@
+# backend/app/core/metrics.py
+"""
+Latency histograms in Prometheus text format (served at /metrics).
+
+Two families:
+
+  eunoia_request_duration_seconds{route, method}
+      time for a route handler to return its response (for streaming
+      responses: until the stream starts, the stream itself is covered
+      by the stages below);
+  eunoia_stage_duration_seconds{route, stage, target}
+      one request stage: auth, db (target = "METHOD table"), llm
+      (target = "provider:workload"), tts, mix, encode, upload.
+
+`route` is the matched path template (e.g. /meditate/download/{filename}),
+set by TimedRoute for the request's task and inherited by everything it
+awaits or spawns; work outside a request (job workers) sets its own label.
+Observing is a bisect and three additions under a lock, so it can sit on
+the hot path.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+# Seconds; from a cached-token auth check to a full meditation render.
+BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+current_route: ContextVar[str] = ContextVar("current_route", default="none")
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...], buckets=BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, values: tuple[str, ...], seconds: float) -> None:
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(v, list(c), s, n) for v, (c, s, n) in self._series.items()]
+        for values, counts, total, count in sorted(series):
+            labels = ",".join(
+                f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values)
+            )
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+            yield f'{self.name}_bucket{{{labels},le="+Inf"}} {count}'
+            yield f"{self.name}_sum{{{labels}}} {total}"
+            yield f"{self.name}_count{{{labels}}} {count}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram(
+    "eunoia_request_duration_seconds",
+    "Route handler latency until the response is returned.",
+    ("route", "method"),
+)
+STAGE_SECONDS = Histogram(
+    "eunoia_stage_duration_seconds",
+    "Latency of one request stage (auth, db, llm, tts, mix, encode, upload).",
+    ("route", "stage", "target"),
+)
+
+
+def observe_stage(stage: str, target: str, seconds: float) -> None:
+    STAGE_SECONDS.observe((current_route.get(), stage, target), seconds)
+
+
+@contextmanager
+def timed(stage: str, target: str = "") -> Iterator[None]:
+    """Record the block's duration (failed or not) as one stage observation."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, target, time.perf_counter() - t0)
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that labels the request with its path template and times it."""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        path = self.path
+
+        async def timed_handler(request: Request) -> Response:
+            # Not reset on return: a streaming body runs later in this task.
+            current_route.set(path)
+            t0 = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                REQUEST_SECONDS.observe(
+                    (path, request.method), time.perf_counter() - t0
+                )
+
+        return timed_handler
+
+
+def render() -> str:
+    lines = [*REQUEST_SECONDS.render(), *STAGE_SECONDS.render()]
+    return "\n".join(lines) + "\n"
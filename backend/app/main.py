@@ -1,11 +1,45 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 import app.core.logging  # side-effect: configures logging
 from app.api.chat import router as chat_router
+from app.api.meditate import AUDIO_MAP
 from app.api.meditate import router as meditate_router
+from app.core import metrics
 from app.core.config import settings
+from app.services import bg_cache
+from app.services.audio_pool import mix_pool
+from app.services.audio_retention import audio_retention
+from app.services.context_window import warm_tokenizer
+from app.services.meditation_jobs import meditation_jobs
+from app.services.storage_upload import storage_uploader
+from app.services.supabase_client import start_supabase, stop_supabase
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_supabase()
+    if settings.BG_CACHE_WARM:
+        await asyncio.to_thread(
+            bg_cache.warm, AUDIO_MAP.values(), settings.BG_CACHE_DIR
+        )
+    mix_pool.start()
+    await meditation_jobs.start()
+    await audio_retention.start()
+    tokenizer = asyncio.create_task(warm_tokenizer())  # may download; not awaited
+    yield
+    tokenizer.cancel()
+    await audio_retention.stop()
+    await meditation_jobs.stop()
+    mix_pool.stop()
+    await storage_uploader.aclose()
+    await stop_supabase()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,7 +47,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Transcript", "X-Audio-File"],  # POST /meditate/stream
 )
 
 app.include_router(chat_router)
 app.include_router(meditate_router)
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Request and per-stage latency histograms, Prometheus text format."""
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
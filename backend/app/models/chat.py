@@ -15,13 +15,14 @@ class StartSessionResponse(BaseModel):
 class ChatRequest(BaseModel):
     """
     Request model for sending a chat message. Takes the session ID, user ID, message content,
-    and the model type (default is "openai").
+    and the model type (default is "openai"). `use_cache=False` forces a fresh reply.
     """
 
     session_id: str
     user_id: str
     message: str
     model: Literal["openai", "gemini"] = "openai"
+    use_cache: bool = True
 
 
 class ChatMessageResponse(BaseModel):
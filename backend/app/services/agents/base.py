@@ -1,10 +1,35 @@
-def format_logs_input(study, sleep, mood, user_msg: str) -> str:
-    """Single prompt string fed to the LLMs."""
+class EmptyReply(Exception):
+    """A provider answered without any text; treated like a failed call."""
+
+
+def format_context(digest: str) -> str:
+    """
+    Per-session instructions plus the logs digest (see log_digest.py).
+    Identical on every turn of a session, so it is sent as the leading
+    system prompt: the stable prefix providers can cache (OpenAI prefix
+    caching, Gemini cached content), with history and the question after it.
+    """
     return (
-        "The user’s wellbeing data for the last 2 weeks is below.\n\n"
-        f"Study sessions ({len(study)}): {study}\n\n"
-        f"Sleep logs ({len(sleep)}): {sleep}\n\n"
-        f"Mood logs ({len(mood)}): {mood}\n\n"
-        f"User question: {user_msg}\n\n"
-        "Answer helpfully and concisely, referring to the data when useful. Return the answer in plain text. Limit to about five sentences."
+        "You are a wellbeing assistant.\n\n"
+        "The user’s wellbeing data for the last 2 weeks is summarised below "
+        "(scores are 1-5, p = productivity).\n\n"
+        f"{digest}\n\n"
+        "Answer the user's questions helpfully and concisely, referring to the data when useful. Return the answer in plain text. Limit to about five sentences."
     )
+
+
+def format_summary_input(summary: str | None, turns: list) -> str:
+    """Prompt that folds `turns` into the previous rolling summary."""
+    transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+    return (
+        "Update the running summary of a conversation between a user and a wellbeing assistant.\n"
+        "Keep what matters for later answers: the user's concerns, goals, facts they shared and advice already given. "
+        "Plain text, at most 120 words.\n\n"
+        f"Current summary:\n{summary or '(none yet)'}\n\n"
+        f"New turns:\n{transcript}\n\n"
+        "Updated summary:"
+    )
+
+
+def format_summary_context(summary: str) -> str:
+    return f"Summary of the earlier part of this conversation:\n{summary}"
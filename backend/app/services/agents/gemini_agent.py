@@ -1,35 +1,160 @@
 import os
+import time
+from typing import AsyncIterator
 
-from app.services.agents.base import format_logs_input
+from app.core.config import settings
+from app.core.metrics import timed
+from app.services.agents.base import (
+    EmptyReply,
+    format_context,
+    format_summary_context,
+)
+from app.services.prompt_usage import prompt_usage
 from google import genai
+from google.genai import errors, types
 
 client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 
+MODEL = "gemini-2.5-flash"
 
-def chat_with_gemini(study, sleep, mood, user_msg: str, history: list) -> str:
-    prompt = format_logs_input(study, sleep, mood, user_msg)
 
+def _build_contents(user_msg: str, history: list, summary: str | None = None) -> list:
+    # After the (cached) context: summary of older turns, then the
+    # token-budgeted window (see context_window.py), then the question.
     contents = []
-    for turn in history[-6:]:
+    if summary:
+        contents.append(
+            {"role": "user", "parts": [{"text": format_summary_context(summary)}]}
+        )
+    for turn in history:
         role = (
             "user" if turn["role"] == "user" else "model"
         )  # map 'assistant' -> 'model'
         contents.append({"role": role, "parts": [{"text": turn["content"]}]})
 
-    contents.append({"role": "user", "parts": [{"text": prompt}]})
+    contents.append({"role": "user", "parts": [{"text": user_msg}]})
+    return contents
+
+
+def _live_cache(context_cache: dict | None) -> str | None:
+    """The session's cached-content name, unless it is about to expire."""
+    if not context_cache:
+        return None
+    if context_cache["expires_at"] - time.time() < settings.GEMINI_CACHE_MARGIN:
+        return None
+    return context_cache["name"]
+
+
+def _config(digest: str, cache_name: str | None) -> types.GenerateContentConfig:
+    if cache_name is not None:
+        return types.GenerateContentConfig(cached_content=cache_name)
+    return types.GenerateContentConfig(system_instruction=format_context(digest))
 
+
+def _record(usage) -> None:
+    if usage is not None:
+        prompt_usage.record(
+            "gemini", usage.prompt_token_count, usage.cached_content_token_count
+        )
+
+
+async def create_context_cache(digest: str) -> dict | None:
+    """
+    Register the session context as Gemini cached content, so turns send
+    only history + question and reference it by name. Returns
+    {"name", "expires_at"} to store with the session, or None when caching is
+    off or the context is below Gemini's minimum cacheable size (turns then
+    send it inline as the system instruction, where implicit caching applies).
+    """
+    context = format_context(digest)
+    if not settings.GEMINI_CONTEXT_CACHE:
+        return None
+    if len(context) // 4 < settings.GEMINI_CACHE_MIN_TOKENS:  # ~4 chars/token
+        return None
+    with timed("llm", "gemini:context_cache"):
+        cache = await client.aio.caches.create(
+            model=MODEL,
+            config=types.CreateCachedContentConfig(
+                system_instruction=context,
+                ttl=f"{int(settings.GEMINI_CACHE_TTL)}s",
+            ),
+        )
+    return {"name": cache.name, "expires_at": time.time() + settings.GEMINI_CACHE_TTL}
+
+
+def chat_with_gemini(
+    digest: str, user_msg: str, history: list, summary: str | None = None
+) -> str:
+    """Errors (and empty answers) propagate, so the router can fall back."""
+    response = client.models.generate_content(
+        model=MODEL,
+        contents=_build_contents(user_msg, history, summary),
+        config=_config(digest, None),
+    )
+    _record(response.usage_metadata)
+    if not response.text:
+        raise EmptyReply("Gemini returned no response.")
+    return response.text.strip()
+
+
+async def achat_with_gemini(
+    digest: str,
+    user_msg: str,
+    history: list,
+    summary: str | None = None,
+    context_cache: dict | None = None,
+) -> str:
+    contents = _build_contents(user_msg, history, summary)
+    cache_name = _live_cache(context_cache)
     try:
-        print("[Gemini] Sending prompt contents:", contents)
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=contents,
+        response = await client.aio.models.generate_content(
+            model=MODEL, contents=contents, config=_config(digest, cache_name)
+        )
+    except errors.ClientError:
+        if cache_name is None:
+            raise
+        # Handle deleted or expired early: send the context inline instead.
+        response = await client.aio.models.generate_content(
+            model=MODEL, contents=contents, config=_config(digest, None)
         )
+    _record(response.usage_metadata)
+    if not response.text:
+        raise EmptyReply("Gemini returned no response.")
+    return response.text.strip()
 
-        if not response or not hasattr(response, "text") or not response.text:
-            return "Gemini returned no response."
 
-        return response.text.strip()
+async def astream_gemini(
+    digest: str,
+    user_msg: str,
+    history: list,
+    summary: str | None = None,
+    context_cache: dict | None = None,
+) -> AsyncIterator[str]:
+    """Yield reply tokens as Gemini produces them. Errors propagate to the caller."""
+    contents = _build_contents(user_msg, history, summary)
+    cache_name = _live_cache(context_cache)
+    try:
+        stream = await client.aio.models.generate_content_stream(
+            model=MODEL, contents=contents, config=_config(digest, cache_name)
+        )
+    except errors.ClientError:
+        if cache_name is None:
+            raise
+        stream = await client.aio.models.generate_content_stream(
+            model=MODEL, contents=contents, config=_config(digest, None)
+        )
+    usage = None
+    async for chunk in stream:
+        usage = chunk.usage_metadata or usage
+        if chunk.text:
+            yield chunk.text
+    _record(usage)
+
 
-    except Exception as e:
-        print("[Gemini] Error:", str(e))
-        return "Gemini agent failed due to an internal error."
+async def asummarize_with_gemini(prompt: str) -> str:
+    response = await client.aio.models.generate_content(
+        model=MODEL, contents=[{"role": "user", "parts": [{"text": prompt}]}]
+    )
+    if not response.text:
+        raise EmptyReply("Gemini returned no summary.")
+    return response.text.strip()
@@ -1,17 +1,100 @@
+import hashlib
+from typing import AsyncIterator
+
 from app.core.config import settings
-from app.services.agents.base import format_logs_input
-from openai import OpenAI
+from app.services.agents.base import (
+    EmptyReply,
+    format_context,
+    format_summary_context,
+)
+from app.services.prompt_usage import prompt_usage
+from openai import AsyncOpenAI, OpenAI
 
 client = OpenAI()
+async_client = AsyncOpenAI()
+
+
+def _build_messages(
+    digest: str, user_msg: str, history: list, summary: str | None = None
+) -> list:
+    # Context first and unchanged for the session: a cacheable prefix.
+    # `history` is already the token-budgeted window (see context_window.py).
+    messages = [{"role": "system", "content": format_context(digest)}]
+    if summary:
+        messages.append({"role": "system", "content": format_summary_context(summary)})
+    return [*messages, *history, {"role": "user", "content": user_msg}]
+
+
+def _prompt_cache_key(digest: str) -> str:
+    """Routes a session's requests to the same prefix cache."""
+    return hashlib.blake2b(digest.encode(), digest_size=16).hexdigest()
+
+
+def _record(usage) -> None:
+    if usage is None:
+        return
+    details = usage.prompt_tokens_details
+    prompt_usage.record(
+        "openai", usage.prompt_tokens, details.cached_tokens if details else 0
+    )
+
+
+def chat_with_openai(
+    digest: str, user_msg: str, history: list, summary: str | None = None
+) -> str:
+    messages = _build_messages(digest, user_msg, history, summary)
+    resp = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        prompt_cache_key=_prompt_cache_key(digest),
+    )
+    _record(resp.usage)
+    content = resp.choices[0].message.content
+    if not content:
+        raise EmptyReply("OpenAI returned no reply.")
+    return content.strip()
+
+
+async def achat_with_openai(
+    digest: str, user_msg: str, history: list, summary: str | None = None
+) -> str:
+    messages = _build_messages(digest, user_msg, history, summary)
+    resp = await async_client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        prompt_cache_key=_prompt_cache_key(digest),
+    )
+    _record(resp.usage)
+    content = resp.choices[0].message.content
+    if not content:
+        raise EmptyReply("OpenAI returned no reply.")
+    return content.strip()
+
+
+async def astream_openai(
+    digest: str, user_msg: str, history: list, summary: str | None = None
+) -> AsyncIterator[str]:
+    """Yield reply tokens as OpenAI produces them."""
+    messages = _build_messages(digest, user_msg, history, summary)
+    stream = await async_client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        prompt_cache_key=_prompt_cache_key(digest),
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    async for chunk in stream:
+        if chunk.usage is not None:  # final chunk, no choices
+            _record(chunk.usage)
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
 
 
-def chat_with_openai(study, sleep, mood, user_msg: str, history: list) -> str:
-    prompt = format_logs_input(study, sleep, mood, user_msg)
-    messages = [
-        {"role": "system", "content": "You are a wellbeing assistant."},
-        *history[-6:],  # keep context short
-        {"role": "user", "content": prompt},
-    ]
-    resp = client.chat.completions.create(model="gpt-4o-mini", messages=messages)
+async def asummarize_with_openai(prompt: str) -> str:
+    resp = await async_client.chat.completions.create(
+        model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}]
+    )
     content = resp.choices[0].message.content
-    return content.strip() if content else "Sorry, no reply was generated."
+    if not content:
+        raise EmptyReply("OpenAI returned no summary.")
+    return content.strip()
@@ -1,14 +1,213 @@
-from .gemini_agent import chat_with_gemini
-from .openai_agent import chat_with_openai
-
-
-def run_agent(model: str, logs: dict, history: list, user_msg: str) -> str:
-    if model == "openai":
-        return chat_with_openai(
-            logs["study"], logs["sleep"], logs["mood"], user_msg, history
-        )
-    if model == "gemini":
-        return chat_with_gemini(
-            logs["study"], logs["sleep"], logs["mood"], user_msg, history
-        )
-    raise ValueError("model must be 'openai' or 'gemini'")
+import logging
+import time
+from functools import partial
+from typing import AsyncIterator, Callable
+
+from app.core.config import settings
+from app.services.provider_router import provider_router
+from app.services.reply_cache import reply_cache
+
+from .base import format_summary_input
+from .gemini_agent import (
+    achat_with_gemini,
+    astream_gemini,
+    asummarize_with_gemini,
+    chat_with_gemini,
+    create_context_cache,
+)
+from .openai_agent import (
+    achat_with_openai,
+    astream_openai,
+    asummarize_with_openai,
+    chat_with_openai,
+)
+
+logger = logging.getLogger(__name__)
+
+AGENTS = {
+    "openai": (chat_with_openai, achat_with_openai, astream_openai),
+    "gemini": (chat_with_gemini, achat_with_gemini, astream_gemini),
+}
+
+
+def _preference(model: str) -> list[str]:
+    """The requested provider first, the others as fallbacks."""
+    if model not in AGENTS:
+        raise ValueError("model must be 'openai' or 'gemini'")
+    return [model, *(m for m in AGENTS if m != model)]
+
+
+def run_agent(
+    model: str, digest: str, history: list, user_msg: str, summary: str | None = None
+) -> str:
+    """`history` is the prompt window (context_window.build_window)."""
+    return provider_router.call_sync(
+        "chat",
+        {
+            m: partial(AGENTS[m][0], digest, user_msg, history, summary)
+            for m in _preference(model)
+        },
+    )
+
+
+async def register_context(digest: str) -> dict | None:
+    """
+    Provider-side cache of a new session's context (Gemini cached content;
+    OpenAI needs nothing registered). Failures only cost the cache.
+    """
+    try:
+        return await create_context_cache(digest)
+    except Exception as e:
+        logger.warning("gemini context cache not created", extra={"error": repr(e)})
+        return None
+
+
+def _session_kwargs(model: str, context_cache: dict | None) -> dict:
+    # Only Gemini takes a cached-content handle; OpenAI caches the prefix itself.
+    return {"context_cache": context_cache} if model == "gemini" else {}
+
+
+async def summarize(summary: str | None, turns: list) -> str:
+    """Fold `turns` into the rolling summary (see context_window.py)."""
+    prompt = format_summary_input(summary, turns)
+    return await provider_router.call(
+        "summary",
+        {
+            "openai": partial(asummarize_with_openai, prompt),
+            "gemini": partial(asummarize_with_gemini, prompt),
+        },
+    )
+
+
+def _cache_key(
+    digest: str,
+    history: list,
+    user_msg: str,
+    summary: str | None,
+    use_cache: bool,
+) -> Callable[[str], str] | None:
+    """Reply-cache key of this prompt as a function of the provider."""
+    if not (use_cache and settings.REPLY_CACHE_ENABLED):
+        return None
+    return lambda provider: reply_cache.key(
+        provider, digest, history, user_msg, summary
+    )
+
+
+def _log_prompt(model: str, history: list, user_msg: str, summary: str | None) -> None:
+    # High-volume at DEBUG: sampled per LOG_SAMPLING, question truncated.
+    logger.debug(
+        "chat prompt",
+        extra={
+            "model": model,
+            "turns": len(history),
+            "summary_chars": len(summary or ""),
+            "question": user_msg,
+        },
+    )
+
+
+def _lookup(model: str, key: Callable[[str], str] | None) -> str | None:
+    return reply_cache.get(model, key(model)) if key is not None else None
+
+
+def _remember(
+    provider: str, key: Callable[[str], str] | None, reply: str, t0: float
+) -> None:
+    # Stored under the provider that answered: after a fallback the reply is
+    # not the requested model's, and a later request for it shouldn't get it.
+    if key is not None and reply:
+        reply_cache.put(provider, key(provider), reply, time.perf_counter() - t0)
+
+
+async def arun_agent(
+    model: str,
+    digest: str,
+    history: list,
+    user_msg: str,
+    summary: str | None = None,
+    use_cache: bool = True,
+    context_cache: dict | None = None,
+) -> str:
+    """
+    Async counterpart of run_agent; awaits the provider instead of blocking.
+    Served from the reply cache when the same question was asked against the
+    same logs, summary and recent history (unless `use_cache` is False). Otherwise the
+    provider router picks the provider (fallback, breakers, hedging) and
+    raises ProvidersUnavailable if none answers. `context_cache` is the
+    session's Gemini cached-content handle, if one was registered.
+    """
+    order = _preference(model)
+    _log_prompt(model, history, user_msg, summary)
+    key = _cache_key(digest, history, user_msg, summary, use_cache)
+    if (cached := _lookup(model, key)) is not None:
+        return cached
+
+    t0 = time.perf_counter()
+    provider, reply = await provider_router.call_with_provider(
+        "chat",
+        {
+            m: partial(
+                AGENTS[m][1],
+                digest,
+                user_msg,
+                history,
+                summary,
+                **_session_kwargs(m, context_cache),
+            )
+            for m in order
+        },
+    )
+    _remember(provider, key, reply, t0)
+    return reply
+
+
+def astream_agent(
+    model: str,
+    digest: str,
+    history: list,
+    user_msg: str,
+    summary: str | None = None,
+    use_cache: bool = True,
+    context_cache: dict | None = None,
+) -> AsyncIterator[str]:
+    """
+    Token stream for the requested provider (see /chat/message/stream), falling
+    back to the other one if it fails before the first token.
+    A cached reply is yielded as a single chunk; a completed stream is cached.
+    """
+    order = _preference(model)
+    _log_prompt(model, history, user_msg, summary)
+    return _cached_stream(
+        model,
+        _cache_key(digest, history, user_msg, summary, use_cache),
+        lambda: provider_router.stream_with_provider(
+            "chat_stream",
+            {
+                m: partial(
+                    AGENTS[m][2],
+                    digest,
+                    user_msg,
+                    history,
+                    summary,
+                    **_session_kwargs(m, context_cache),
+                )
+                for m in order
+            },
+        ),
+    )
+
+
+async def _cached_stream(
+    model: str, key: Callable[[str], str] | None, start
+) -> AsyncIterator[str]:
+    if (cached := _lookup(model, key)) is not None:
+        yield cached
+        return
+
+    t0 = time.perf_counter()
+    provider, parts = model, []
+    async for provider, token in start():
+        parts.append(token)
+        yield token
+    _remember(provider, key, "".join(parts).strip(), t0)
@@ -0,0 +1,155 @@
+# backend/app/services/audio_mix.py
+"""
+CPU-bound audio mixing, kept free of app imports (clients, settings) so it
+can be loaded cheaply inside the mixing process pool (see audio_pool.py).
+
+Mixing works on int16 PCM as NumPy arrays: the background is tiled with one
+vectorised op, summed with the speech in int32 and clipped back to int16.
+pydub is only used for the final MP3 encode (ffmpeg).
+"""
+
+import wave
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+from app.services.bg_cache import CHANNELS, SAMPLE_RATE, SAMPLE_WIDTH, bg_samples
+from pydub import AudioSegment
+
+DEFAULT_CACHE_DIR = Path(".bg_cache")
+INT16_MIN, INT16_MAX = -32768, 32767
+
+
+def tile(x: np.ndarray, n: int) -> np.ndarray:
+    """Repeat `x` end to end and cut it to exactly `n` samples."""
+    if n <= len(x):
+        return x[:n]
+    return np.resize(x, n)
+
+
+def apply_gain(x: np.ndarray, gain_db: float) -> np.ndarray:
+    """Scale int16 samples by `gain_db`, clipping to the int16 range."""
+    if gain_db == 0:
+        return x
+    scaled = x.astype(np.float32) * np.float32(10 ** (gain_db / 20))
+    return np.clip(scaled, INT16_MIN, INT16_MAX).astype(np.int16)
+
+
+def fade(
+    x: np.ndarray, fade_in_ms: int = 0, fade_out_ms: int = 0, rate: int = SAMPLE_RATE
+) -> np.ndarray:
+    """Linear fade in/out over the first/last N milliseconds."""
+    n_in = min(len(x), rate * fade_in_ms // 1000)
+    n_out = min(len(x), rate * fade_out_ms // 1000)
+    if not n_in and not n_out:
+        return x
+    env = np.ones(len(x), dtype=np.float32)
+    if n_in:
+        env[:n_in] = np.linspace(0.0, 1.0, n_in, dtype=np.float32)
+    if n_out:
+        env[len(x) - n_out :] *= np.linspace(1.0, 0.0, n_out, dtype=np.float32)
+    return (x.astype(np.float32) * env).astype(np.int16)
+
+
+def overlay(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Sum two equal-length int16 signals with saturation instead of wraparound."""
+    mixed = a.astype(np.int32)
+    mixed += b
+    np.clip(mixed, INT16_MIN, INT16_MAX, out=mixed)
+    return mixed.astype(np.int16)
+
+
+def mix_pcm(
+    speech: np.ndarray,
+    bg: np.ndarray,
+    bg_gain_db: float = 0,
+    fade_in_ms: int = 0,
+    fade_out_ms: int = 0,
+) -> np.ndarray:
+    """Speech over a background tiled to the speech length."""
+    if bg_gain_db or fade_in_ms or fade_out_ms:
+        track = apply_gain(tile(bg, len(speech)), bg_gain_db)
+        return overlay(speech, fade(track, fade_in_ms, fade_out_ms))
+
+    # Plain case: add the background period by period into one int32
+    # buffer rather than materialising the tiled track.
+    mixed = speech.astype(np.int32)
+    for start in range(0, len(mixed), len(bg)):
+        chunk = mixed[start : start + len(bg)]
+        chunk += bg[: len(chunk)]
+    np.clip(mixed, INT16_MIN, INT16_MAX, out=mixed)
+    return mixed.astype(np.int16)
+
+
+class StreamMixer:
+    """
+    Incremental mix_pcm for the streaming pipeline: takes raw int16 PCM
+    chunks of any size and keeps its place in the (looping) background.
+    """
+
+    def __init__(self, bg: np.ndarray):
+        self.bg = bg
+        self.pos = 0
+        self._carry = b""  # odd trailing byte of the previous chunk
+
+    def mix(self, pcm: bytes) -> bytes:
+        data = self._carry + pcm
+        usable = len(data) - len(data) % SAMPLE_WIDTH
+        self._carry = data[usable:]
+        speech = np.frombuffer(data[:usable], dtype=np.int16)
+        if not len(speech):
+            return b""
+        bg = self.bg.take(np.arange(self.pos, self.pos + len(speech)), mode="wrap")
+        self.pos = (self.pos + len(speech)) % len(self.bg)
+        return overlay(speech, bg).tobytes()
+
+
+def _read_speech(voice_wav: BytesIO) -> np.ndarray:
+    voice_wav.seek(0)
+    with wave.open(voice_wav, "rb") as wf:
+        if (wf.getframerate(), wf.getnchannels(), wf.getsampwidth()) == (
+            SAMPLE_RATE,
+            CHANNELS,
+            SAMPLE_WIDTH,
+        ):
+            return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+
+    # Not the TTS format: let pydub resample/downmix.
+    voice_wav.seek(0)
+    seg = (
+        AudioSegment.from_file(voice_wav, format="wav")
+        .set_frame_rate(SAMPLE_RATE)
+        .set_channels(CHANNELS)
+        .set_sample_width(SAMPLE_WIDTH)
+    )
+    return np.frombuffer(seg.raw_data, dtype=np.int16)
+
+
+def encode_mp3(pcm: np.ndarray) -> BytesIO:
+    out = BytesIO()
+    AudioSegment(
+        data=pcm.tobytes(),
+        sample_width=SAMPLE_WIDTH,
+        frame_rate=SAMPLE_RATE,
+        channels=CHANNELS,
+    ).export(out, format="mp3")
+    out.seek(0)
+    return out
+
+
+def mix_with_bg(
+    voice_wav: BytesIO,
+    bg_path: Path,
+    cache_dir: Path = DEFAULT_CACHE_DIR,
+    fade_in_ms: int = 0,
+    fade_out_ms: int = 0,
+) -> BytesIO:
+    speech = _read_speech(voice_wav)
+    # Pre-decoded, pre-attenuated PCM (see bg_cache.py).
+    bg = bg_samples(bg_path, cache_dir)
+    return encode_mp3(mix_pcm(speech, bg, 0, fade_in_ms, fade_out_ms))
+
+
+def mix_bytes(voice_wav: bytes, bg_path: str, cache_dir: str) -> bytes:
+    """Picklable bytes-in/bytes-out wrapper run in pool workers."""
+    return mix_with_bg(BytesIO(voice_wav), Path(bg_path), Path(cache_dir)).getvalue()
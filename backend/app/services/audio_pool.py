@@ -0,0 +1,94 @@
+# backend/app/services/audio_pool.py
+"""
+Process pool for the MP3 decode/overlay/encode step.
+
+pydub + ffmpeg work is CPU-bound; running it in the request's event loop
+(or a thread, under the GIL) stalls every other request on the worker.
+Here it runs in separate processes, sized to the machine, with a bound on
+how many mixes may be pending so a burst sheds load instead of queueing
+without limit.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from app.core.config import settings
+from app.core.metrics import timed
+from app.services.audio_mix import mix_bytes
+
+
+class PoolBusy(Exception):
+    pass
+
+
+class MixPool:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._executor: ProcessPoolExecutor | None = None
+        self.running = 0  # submitted and not yet finished (queued + mixing)
+        self.completed = 0
+        self.cancelled = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        if self._executor is None:
+            # "spawn": children don't inherit the parent's event loop/threads.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def mix(self, voice_wav: BytesIO, bg_path: Path) -> BytesIO:
+        """
+        Mix in a worker process. Raises PoolBusy when `workers + max_queue`
+        mixes are already pending. If the awaiting request is cancelled, a
+        mix that hasn't started yet is dropped from the queue.
+        """
+        if self.running >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PoolBusy()
+        self.start()
+
+        self.running += 1
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(
+            self._executor,
+            mix_bytes,
+            voice_wav.getvalue(),
+            str(bg_path),
+            settings.BG_CACHE_DIR,
+        )
+        try:
+            with timed("mix", "pool"):
+                out = await fut
+        except asyncio.CancelledError:
+            fut.cancel()  # propagates to the pool future if still queued
+            self.cancelled += 1
+            raise
+        finally:
+            self.running -= 1
+        self.completed += 1
+        return BytesIO(out)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_limit": self.max_queue,
+            "pending": self.running,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+        }
+
+
+mix_pool = MixPool(settings.MIX_WORKERS, settings.MIX_QUEUE_SIZE)
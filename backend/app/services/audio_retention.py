@@ -0,0 +1,193 @@
+# backend/app/services/audio_retention.py
+"""
+Retention for the generated audio directory (AUDIO_DIR).
+
+Every MP3 the backend writes (streamed renders, cached meditations) lands in
+one directory that would otherwise only grow. The manager keeps an index of
+each file's size and last access and, from a background task, deletes
+
+  * files older than `max_age` seconds (by creation/mtime), then
+  * least recently accessed files until the directory is under `max_bytes`.
+
+Last access is the file's atime, set explicitly on downloads (`touch()`) and
+on meditation cache hits (mtime is never touched, so download ETags stay
+valid), which makes the LRU order shared by all workers and restart-safe.
+The index is reconciled with the directory on every sweep to pick up files
+written or deleted by other processes.
+
+A cache entry's JSON sidecar is removed together with its MP3. Stale entries
+left in meditation_cache's in-memory index are treated as misses there.
+
+track() and touch() are called from worker threads (cache fills, the sync
+download route) as well as the loop: the index is guarded by a lock and the
+sweeper is woken through the loop.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AudioRetention:
+    def __init__(self, directory: str, max_bytes: int, max_age: float, interval: float):
+        self.dir = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.interval = interval
+        # file name -> (size, atime, mtime, inode)
+        self._index: dict[str, tuple[int, float, float, int]] = {}
+        self._lock = threading.Lock()
+        self._wake: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+        self.evicted_lru = 0
+        self.evicted_age = 0
+        self.bytes_evicted = 0
+        self.sweeps = 0
+        self.last_sweep_at: float | None = None
+        self.last_sweep_secs: float | None = None
+
+    async def start(self) -> None:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._wake = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run(), name="audio-retention")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def track(self, path: Path) -> None:
+        """Record a newly written file; wakes the sweeper if over quota."""
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._index[path.name] = (st.st_size, st.st_atime, st.st_mtime, st.st_ino)
+            over = self._total_bytes() > self.max_bytes
+        if over and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def touch(self, path: Path) -> None:
+        """Mark a file as just accessed (atime only)."""
+        try:
+            st = path.stat()
+            now = time.time_ns()
+            os.utime(path, ns=(now, st.st_mtime_ns))
+        except FileNotFoundError:
+            with self._lock:
+                self._index.pop(path.name, None)
+            return
+        with self._lock:
+            self._index[path.name] = (st.st_size, now / 1e9, st.st_mtime, st.st_ino)
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes()
+
+    def _total_bytes(self) -> int:
+        # Hard links (a streamed file that was also cached) count once.
+        return sum({ino: size for size, _, _, ino in self._index.values()}.values())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception:
+                logger.exception("audio retention sweep failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _scan(self) -> dict[str, tuple[int, float, float, int]]:
+        index = {}
+        with os.scandir(self.dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".mp3") or not entry.is_file():
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                index[entry.name] = (st.st_size, st.st_atime, st.st_mtime, st.st_ino)
+        return index
+
+    def _delete(self, index: dict, links: Counter, name: str) -> int:
+        """Remove one file (and its sidecar); returns the bytes actually freed."""
+        size, _, _, ino = index.pop(name)
+        path = self.dir / name
+        path.unlink(missing_ok=True)
+        path.with_suffix(".json").unlink(missing_ok=True)  # cache sidecar, if any
+        links[ino] -= 1
+        return 0 if links[ino] else size
+
+    def sweep(self) -> None:
+        """
+        Blocking (runs in a thread): rebuild the index from the directory and
+        evict. Works on a private copy and swaps it in at the end, so
+        concurrent touch()/track() calls never see a half-updated index.
+        """
+        t0 = time.perf_counter()
+        index = self._scan()
+        links = Counter(ino for _, _, _, ino in index.values())
+
+        cutoff = time.time() - self.max_age
+        for name in [n for n, (_, _, mtime, _) in index.items() if mtime < cutoff]:
+            self.bytes_evicted += self._delete(index, links, name)
+            self.evicted_age += 1
+
+        total = sum({ino: size for size, _, _, ino in index.values()}.values())
+        for name in sorted(index, key=lambda n: index[n][1]):
+            if total <= self.max_bytes:
+                break
+            freed = self._delete(index, links, name)
+            total -= freed
+            self.bytes_evicted += freed
+            self.evicted_lru += 1
+
+        with self._lock:
+            self._index = index
+        self.sweeps += 1
+        self.last_sweep_at = time.time()
+        self.last_sweep_secs = time.perf_counter() - t0
+
+    def stats(self) -> dict:
+        with self._lock:
+            files, total = len(self._index), self._total_bytes()
+        return {
+            "files": files,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "usage": total / self.max_bytes if self.max_bytes else 0.0,
+            "max_age_secs": self.max_age,
+            "evicted_lru": self.evicted_lru,
+            "evicted_age": self.evicted_age,
+            "bytes_evicted": self.bytes_evicted,
+            "sweeps": self.sweeps,
+            "last_sweep_at": self.last_sweep_at,
+            "last_sweep_secs": (
+                round(self.last_sweep_secs, 4) if self.last_sweep_secs else None
+            ),
+        }
+
+
+audio_retention = AudioRetention(
+    settings.AUDIO_DIR,
+    max_bytes=settings.AUDIO_RETENTION_BYTES,
+    max_age=settings.AUDIO_RETENTION_MAX_AGE,
+    interval=settings.AUDIO_RETENTION_INTERVAL,
+)
@@ -0,0 +1,62 @@
+# backend/app/services/audio_stream.py
+"""
+Incremental MP3 encoding for the streaming meditation pipeline.
+
+PCM goes into an ffmpeg subprocess as it arrives and MP3 frames are read
+back as soon as ffmpeg emits them, so neither the PCM nor the MP3 is ever
+held in memory in full and encoding runs outside the event loop's process.
+"""
+
+import asyncio
+from typing import AsyncIterator
+
+from app.core.metrics import timed
+from app.services.bg_cache import CHANNELS, SAMPLE_RATE
+
+READ_SIZE = 16 * 1024
+
+
+async def encode_mp3_stream(pcm_chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    proc = await asyncio.create_subprocess_exec(
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-f",
+        "s16le",
+        "-ar",
+        str(SAMPLE_RATE),
+        "-ac",
+        str(CHANNELS),
+        "-i",
+        "pipe:0",
+        "-f",
+        "mp3",
+        "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+    )
+
+    async def feed() -> None:
+        try:
+            async for pcm in pcm_chunks:
+                proc.stdin.write(pcm)
+                await proc.stdin.drain()
+        finally:
+            proc.stdin.close()
+
+    feeder = asyncio.create_task(feed())
+    try:
+        # Wall time of the whole stream: encode runs as fast as TTS feeds it.
+        with timed("encode", "ffmpeg_stream"):
+            while chunk := await proc.stdout.read(READ_SIZE):
+                yield chunk
+            await feeder  # surface TTS/mix errors
+            if await proc.wait() != 0:
+                raise RuntimeError(f"ffmpeg exited with {proc.returncode}")
+    finally:
+        if not feeder.done():
+            feeder.cancel()
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
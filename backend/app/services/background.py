@@ -0,0 +1,18 @@
+# backend/app/services/background.py
+import asyncio
+from typing import Coroutine
+
+# Strong refs so fire-and-forget tasks aren't garbage-collected mid-flight.
+_tasks: set[asyncio.Task] = set()
+
+
+def spawn(coro: Coroutine) -> asyncio.Task:
+    """
+    Run a coroutine detached from the current request.
+    Used for writes that must finish even if the client has gone away
+    (e.g. persisting a streamed reply after a disconnect).
+    """
+    task = asyncio.get_running_loop().create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
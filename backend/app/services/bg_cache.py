@@ -0,0 +1,93 @@
+# backend/app/services/bg_cache.py
+"""
+Decoded background tracks.
+
+There are only a handful of background MP3s, so instead of decoding one with
+ffmpeg (and re-applying gain) on every meditation, each is decoded once into
+raw PCM at the TTS format (24 kHz, mono, 16-bit) with the attenuation already
+applied, written to `cache_dir`, and memory-mapped. Every process that mixes
+maps the same file, so the pages are shared through the OS page cache.
+
+Like audio_mix.py this module has no app imports; it runs in pool workers.
+"""
+
+import mmap
+import os
+from pathlib import Path
+
+import numpy as np
+from pydub import AudioSegment
+
+SAMPLE_RATE = 24_000  # matches the TTS pcm output
+SAMPLE_WIDTH = 2
+CHANNELS = 1
+BG_GAIN_DB = -15
+
+# bg_path -> mapped PCM, per process
+_tracks: dict[Path, mmap.mmap] = {}
+
+
+def _pcm_path(bg_path: Path, cache_dir: Path) -> Path:
+    # Keyed on the source file's size/mtime so replacing a track re-decodes it.
+    st = bg_path.stat()
+    return cache_dir / (
+        f"{bg_path.stem}-{st.st_size}-{st.st_mtime_ns}"
+        f"-{SAMPLE_RATE}hz{BG_GAIN_DB}db.pcm"
+    )
+
+
+def decode_track(bg_path: Path) -> bytes:
+    seg = AudioSegment.from_file(bg_path)
+    seg = (
+        seg.set_frame_rate(SAMPLE_RATE)
+        .set_channels(CHANNELS)
+        .set_sample_width(SAMPLE_WIDTH)
+    )
+    return (seg + BG_GAIN_DB).raw_data
+
+
+def load_track(bg_path: Path, cache_dir: Path) -> mmap.mmap:
+    """Attenuated PCM for `bg_path`, decoding it on first use."""
+    bg_path = Path(bg_path)
+    track = _tracks.get(bg_path)
+    if track is not None:
+        return track
+
+    pcm_path = _pcm_path(bg_path, Path(cache_dir))
+    if not pcm_path.exists():
+        pcm_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = pcm_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(decode_track(bg_path))
+        os.replace(tmp, pcm_path)  # atomic: concurrent workers never see a partial file
+
+    with open(pcm_path, "rb") as f:
+        track = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    _tracks[bg_path] = track
+    return track
+
+
+def bg_samples(bg_path: Path, cache_dir: Path) -> np.ndarray:
+    """Zero-copy int16 view over the mapped PCM of `bg_path`."""
+    return np.frombuffer(load_track(bg_path, cache_dir), dtype=np.int16)
+
+
+def warm(bg_paths, cache_dir: Path) -> None:
+    for bg_path in bg_paths:
+        load_track(bg_path, cache_dir)
+
+
+def report(bg_paths, cache_dir: Path) -> dict:
+    """Size of each decoded track and whether this process has it mapped."""
+    out = {}
+    bytes_per_sec = SAMPLE_RATE * SAMPLE_WIDTH * CHANNELS
+    for bg_path in map(Path, bg_paths):
+        pcm_path = _pcm_path(bg_path, Path(cache_dir))
+        size = pcm_path.stat().st_size if pcm_path.exists() else 0
+        out[bg_path.stem] = {
+            "decoded": pcm_path.exists(),
+            "mapped": bg_path in _tracks,
+            "pcm_bytes": size,
+            "seconds": round(size / bytes_per_sec, 1),
+            "source_bytes": bg_path.stat().st_size,
+        }
+    return out
@@ -0,0 +1,173 @@
+# backend/app/services/context_window.py
+"""
+Token-budgeted history window for chat prompts.
+
+Instead of a fixed number of turns, each prompt carries the newest turns
+that fit the model's history budget (CHAT_HISTORY_BUDGET). Turns that no
+longer fit are folded into a rolling summary kept with the session
+(`summary`, plus `summarized` = how many leading turns it covers, see
+supabase/migrations/*_add_chat_session_summary.sql). Folding is
+incremental: only the turns that dropped out since the last fold are sent
+to the summarizer, together with the previous summary, so its cost doesn't
+grow with the session.
+
+Every turn is in exactly one of the two: the window starts right after the
+summarized turns. Turns that left the budget but aren't folded yet (fewer
+than CHAT_SUMMARY_MIN_TURNS, or a fold failed) stay in the window until
+they are, so the budget is exceeded by at most those.
+
+Token counts use tiktoken when it is installed and its encoding has been
+loaded (warm_tokenizer, started with the app, never on a request), an
+estimate otherwise, and are memoized per message text, so each turn is
+counted once.
+"""
+
+import asyncio
+import logging
+import weakref
+from functools import lru_cache
+
+from app.core.config import settings
+from app.services.agents.router import summarize
+from app.services.session_store import AsyncSessionStore
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+TURN_OVERHEAD = 4  # role/separator tokens per message
+
+
+_encoding = None  # tiktoken encoding once loaded; None -> estimate
+
+
+def load_encoding() -> bool:
+    """
+    Blocking (tiktoken may download the BPE file): run off the event loop,
+    see warm_tokenizer. A failure isn't remembered, so the next call retries.
+    """
+    global _encoding
+    if _encoding is not None or tiktoken is None:
+        return _encoding is not None
+    try:
+        _encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(
+            "tiktoken unavailable, estimating tokens", extra={"error": repr(e)}
+        )
+        return False
+    count_tokens.cache_clear()  # drop estimates made while loading
+    return True
+
+
+async def warm_tokenizer(retry_every: float = 300.0) -> None:
+    """Load the encoding in the background at startup, retrying on failure."""
+    while not await asyncio.to_thread(load_encoding):
+        if tiktoken is None:
+            return
+        await asyncio.sleep(retry_every)
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    if _encoding is None:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def turn_tokens(turn: dict) -> int:
+    return count_tokens(turn["content"]) + TURN_OVERHEAD
+
+
+def budget(model: str) -> int:
+    return settings.CHAT_HISTORY_BUDGET.get(model, settings.CHAT_HISTORY_DEFAULT_BUDGET)
+
+
+def window_start(history: list, model: str) -> int:
+    """Index of the oldest turn that still fits the model's budget."""
+    remaining = budget(model)
+    start = len(history)
+    while start > 0:
+        cost = turn_tokens(history[start - 1])
+        if cost > remaining:
+            break
+        remaining -= cost
+        start -= 1
+    return start
+
+
+def folded(sess: dict) -> int:
+    """How many leading turns of the loaded `history` the summary covers."""
+    # Positions in `history` are offset by the turns that weren't loaded
+    # (session_store, `history_base`).
+    base = sess.get("history_base") or 0
+    return min(max((sess.get("summarized") or 0) - base, 0), len(sess["history"]))
+
+
+def build_window(sess: dict, model: str) -> tuple[list, str | None]:
+    """
+    (turns, summary) to send for the session: every turn the summary doesn't
+    cover yet, and the rolling summary if any earlier turns were folded into
+    it. Normally these are exactly the newest turns within the budget; turns
+    still waiting to be folded come along rather than being dropped.
+    """
+    history = sess["history"]
+    return history[folded(sess) :], sess.get("summary") or None
+
+
+class SummaryFolder:
+    """Folds turns that left the window into the session's rolling summary."""
+
+    def __init__(self):
+        # One fold per session at a time; later calls see the updated summary.
+        self._locks: "weakref.WeakValueDictionary[tuple[str, str], asyncio.Lock]" = (
+            weakref.WeakValueDictionary()
+        )
+        self.folds = 0
+        self.turns_folded = 0
+        self.failures = 0
+
+    async def maintain(self, user_id: str, sid: str, model: str) -> None:
+        key = (user_id, sid)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+
+        async with lock:
+            sess = await AsyncSessionStore.get(user_id, sid)
+            if not sess:
+                return
+            history = sess["history"]
+            base = sess.get("history_base") or 0
+            done = folded(sess)
+            start = window_start(history, model)
+            if start - done < settings.CHAT_SUMMARY_MIN_TURNS:
+                return
+            try:
+                summary = await summarize(sess.get("summary"), history[done:start])
+            except Exception as e:
+                self.failures += 1
+                logger.warning(
+                    "history summary failed",
+                    extra={"session_id": sid, "error": repr(e)},
+                )
+                return
+            await AsyncSessionStore.set_summary(user_id, sid, summary, base + start)
+            self.folds += 1
+            self.turns_folded += start - done
+
+    def stats(self) -> dict:
+        return {
+            "tokenizer": "tiktoken" if _encoding is not None else "estimate",
+            "budgets": settings.CHAT_HISTORY_BUDGET,
+            "folds": self.folds,
+            "turns_folded": self.turns_folded,
+            "failures": self.failures,
+            "token_counts_cached": count_tokens.cache_info().currsize,
+        }
+
+
+summary_folder = SummaryFolder()
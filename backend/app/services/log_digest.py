@@ -0,0 +1,119 @@
+# backend/app/services/log_digest.py
+from collections import defaultdict
+from datetime import datetime
+from statistics import mean
+
+NOTE_LIMIT = 6  # most recent notes kept across all three tables
+NOTE_CHARS = 120  # each note is cut to this many characters
+
+
+def _parse(ts: str | None) -> datetime | None:
+    if not ts:
+        return None
+    try:
+        return datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _trend(values: list[float]) -> str:
+    """Compare the older and newer half of a chronological series."""
+    if len(values) < 4:
+        return "not enough data"
+    half = len(values) // 2
+    delta = mean(values[half:]) - mean(values[:half])
+    if delta > 0.3:
+        return f"improving (+{delta:.1f})"
+    if delta < -0.3:
+        return f"declining ({delta:.1f})"
+    return "steady"
+
+
+def _study_section(study: list[dict]) -> list[str]:
+    if not study:
+        return ["Study: no sessions."]
+
+    days: dict[str, dict] = defaultdict(lambda: {"n": 0, "mins": 0.0, "prod": []})
+    for row in study:
+        start, end = _parse(row.get("started_at")), _parse(row.get("ended_at"))
+        if not start:
+            continue
+        day = days[start.date().isoformat()]
+        day["n"] += 1
+        if end:
+            secs = (end - start).total_seconds() - (row.get("total_break_secs") or 0)
+            day["mins"] += max(secs, 0) / 60
+        if row.get("productivity") is not None:
+            day["prod"].append(row["productivity"])
+
+    ordered = sorted(days.items())
+    total_h = sum(d["mins"] for _, d in ordered) / 60
+    prods = [p for _, d in ordered for p in d["prod"]]
+    head = f"Study: {len(study)} sessions on {len(ordered)} days, {total_h:.1f}h total"
+    if prods:
+        head += f", avg productivity {mean(prods):.1f}/5, trend {_trend(prods)}"
+    per_day = "; ".join(
+        f"{date[5:]} {d['n']}x {d['mins']:.0f}m"
+        + (f" p{mean(d['prod']):.1f}" if d["prod"] else "")
+        for date, d in ordered
+    )
+    return [head + ".", f"  per day: {per_day}"]
+
+
+def _scored_section(name: str, rows: list[dict], ts_key: str) -> list[str]:
+    """Sleep/mood: one 1-5 score per row, averaged per calendar day."""
+    if not rows:
+        return [f"{name}: no entries."]
+
+    days: dict[str, list] = defaultdict(list)
+    for row in rows:
+        if row.get("score") is not None and row.get(ts_key):
+            days[str(row[ts_key])[:10]].append(row["score"])
+
+    ordered = sorted(days.items())
+    scores = [mean(s) for _, s in ordered]
+    if not scores:
+        return [f"{name}: {len(rows)} entries, no scores."]
+    head = (
+        f"{name}: {len(rows)} entries, avg {mean(scores):.1f}/5, "
+        f"low {min(scores):g}, high {max(scores):g}, trend {_trend(scores)}."
+    )
+    per_day = "; ".join(f"{date[5:]} {mean(s):g}" for date, s in ordered)
+    return [head, f"  per day: {per_day}"]
+
+
+def _notes(study: list[dict], sleep: list[dict], mood: list[dict]) -> list[str]:
+    notes = []
+    for kind, rows, ts_key in (
+        ("study", study, "started_at"),
+        ("sleep", sleep, "date"),
+        ("mood", mood, "at"),
+    ):
+        for row in rows:
+            text = " ".join((row.get("note") or "").split())
+            if text and row.get(ts_key):
+                notes.append((str(row[ts_key]), kind, text))
+
+    notes.sort(reverse=True)
+    lines = []
+    for ts, kind, text in notes[:NOTE_LIMIT]:
+        if len(text) > NOTE_CHARS:
+            text = text[: NOTE_CHARS - 1] + "…"
+        lines.append(f"  {ts[5:10]} {kind}: {text}")
+    return ["Recent notes:", *lines] if lines else []
+
+
+def build_logs_digest(logs: dict) -> str:
+    """
+    Compact, prompt-ready summary of a user's study/sleep/mood logs:
+    per-day aggregates, averages, trends and the most recent notes.
+    Replaces dumping raw rows (ids, timestamps, user_id) into every prompt.
+    """
+    study, sleep, mood = logs["study"], logs["sleep"], logs["mood"]
+    lines = [
+        *_study_section(study),
+        *_scored_section("Sleep", sleep, "date"),
+        *_scored_section("Mood", mood, "at"),
+        *_notes(study, sleep, mood),
+    ]
+    return "\n".join(lines)
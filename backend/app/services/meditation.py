@@ -1,20 +1,44 @@
 # # backend/app/services/meditation.py
+import asyncio
+import logging
 import os
+import re
 import time
 import wave
+from collections import deque
 from io import BytesIO
 from pathlib import Path
+from typing import AsyncIterator, Callable
 
-from app.services.supabase_client import supabase
+from app.core.config import settings
+from app.core.metrics import timed
+from app.services.audio_mix import StreamMixer
+from app.services.audio_mix import mix_with_bg  # noqa: F401  (re-exported)
+from app.services.audio_pool import mix_pool
+from app.services.audio_retention import audio_retention
+from app.services.agents.base import EmptyReply
+from app.services.audio_stream import encode_mp3_stream
+from app.services.background import spawn
+from app.services.bg_cache import CHANNELS, SAMPLE_RATE, SAMPLE_WIDTH, bg_samples
+from app.services.meditation_cache import make_key, meditation_cache
+from app.services.provider_router import ProvidersUnavailable, provider_router
+from app.services.storage_upload import storage_uploader
+from app.services.supabase_client import execute, get_async_supabase
 from fastapi import HTTPException
 from google import genai
-from openai import AsyncOpenAI, OpenAI
-from pydub import AudioSegment
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
 
-client = OpenAI()
 async_client = AsyncOpenAI()
 gemini_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 
+TTS_MODEL = "gpt-4o-mini-tts"
+TTS_VOICE = "nova"
+
+PAUSE_RE = re.compile(r"\[\s*pause\s*\]", re.IGNORECASE)
+SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+
 
 def generate_meditation_prompt(logs: str) -> str:
     """
@@ -38,22 +62,26 @@ def generate_meditation_prompt(logs: str) -> str:
         f"Recent mood logs: {logs}\nPrompt:"
     )
     try:
-        response = gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[{"role": "user", "parts": [{"text": prompt}]}],
-        )
+        with timed("llm", "gemini:meditation_prompt"):
+            response = gemini_client.models.generate_content(
+                model="gemini-2.5-flash",
+                contents=[{"role": "user", "parts": [{"text": prompt}]}],
+            )
         if not response or not hasattr(response, "text") or not response.text:
             return "Gemini returned no prompt."
         return response.text.strip()
     except Exception as e:
-        print(f"[Gemini] Error: {e}")
+        logger.warning("meditation prompt failed", extra={"error": repr(e)})
         return "Create a meditation for relaxation."
 
 
-def generate_transcript(topic: str) -> str:
+DEFAULT_SCRIPT = "Take a deep breath. [pause] You are safe. [pause] Let go of tension."
+
+
+async def generate_transcript(topic: str) -> str:
     """
-    Generates a 1-minute calming meditation script using Gemini.
-    Falls back to OpenAI if Gemini fails.
+    Generates a 1-minute calming meditation script with Gemini or OpenAI,
+    whichever the provider router picks (fallback/hedging, see provider_router).
     The input topic is a vague user phrase like 'feeling sad' or 'tired and demotivated'.
     """
     instruction = (
@@ -67,26 +95,23 @@ def generate_transcript(topic: str) -> str:
         f"User input: '{topic}'\n"
         "Meditation Script:"
     )
+    fallback_instruction = (
+        "You are a meditation guide. Create a short, calming 1-minute meditation script (under 100 words). "
+        "The script should address the emotional need implied by the user input, and include natural pauses like [pause]. "
+        f"The user wrote: '{topic}'"
+    )
 
-    try:
-        response = gemini_client.models.generate_content(
+    async def gemini() -> str:
+        response = await gemini_client.aio.models.generate_content(
             model="gemini-2.5-flash",
             contents=[{"role": "user", "parts": [{"text": instruction}]}],
         )
-        if hasattr(response, "text") and response.text:
-            return response.text.strip()
-    except Exception as e:
-        print(f"[Gemini Fallback Triggered] {e}")
+        if not response or not response.text:
+            raise EmptyReply("Gemini returned no script")
+        return response.text.strip()
 
-    # Fallback to OpenAI
-    print("[Fallback] Using OpenAI GPT-4o-mini.")
-    try:
-        fallback_instruction = (
-            "You are a meditation guide. Create a short, calming 1-minute meditation script (under 100 words). "
-            "The script should address the emotional need implied by the user input, and include natural pauses like [pause]. "
-            f"The user wrote: '{topic}'"
-        )
-        resp = client.chat.completions.create(
+    async def openai() -> str:
+        resp = await async_client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": fallback_instruction},
@@ -94,88 +119,329 @@ def generate_transcript(topic: str) -> str:
             ],
         )
         content = resp.choices[0].message.content
-        return (
-            content.strip()
-            if content
-            else "Take a deep breath. [pause] You are safe. [pause] Let go of tension."
+        if not content:
+            raise EmptyReply("OpenAI returned no script")
+        return content.strip()
+
+    try:
+        return await provider_router.call(
+            "transcript", {"gemini": gemini, "openai": openai}
         )
-    except Exception as e:
-        print(f"[OpenAI Fallback Error] {e}")
-        return "Take a deep breath. [pause] You are safe. [pause] Let go of tension."
+    except ProvidersUnavailable as e:
+        logger.warning(
+            "providers unavailable, using the default script", extra={"error": str(e)}
+        )
+        return DEFAULT_SCRIPT
+
+
+def split_script(transcript: str) -> list[str | int]:
+    """
+    Break a meditation script into TTS-sized pieces: each item is either a
+    sentence to synthesize or a silence length in milliseconds, in order.
+    `[pause]` markers become TTS_PAUSE_MS of silence instead of being read out.
+    """
+    plan: list[str | int] = []
+    for i, passage in enumerate(PAUSE_RE.split(transcript)):
+        if i:
+            plan.append(settings.TTS_PAUSE_MS)
+        sentences = [s.strip() for s in SENTENCE_RE.split(passage) if s.strip()]
+        for j, sentence in enumerate(sentences):
+            if j:
+                plan.append(settings.TTS_SENTENCE_GAP_MS)
+            plan.append(sentence)
+    return plan
+
+
+def silence(ms: int) -> bytes:
+    return bytes(SAMPLE_RATE * ms // 1000 * SAMPLE_WIDTH * CHANNELS)
+
+
+async def tts_pcm(text: str) -> bytes:
+    """Raw 24 kHz mono int16 PCM for one piece of text."""
+    with timed("tts", TTS_MODEL):
+        resp = await async_client.audio.speech.create(
+            model=TTS_MODEL,
+            voice=TTS_VOICE,
+            input=text,
+            response_format="pcm",
+        )
+        return await resp.aread()
+
+
+async def tts_segments(transcript: str) -> AsyncIterator[bytes]:
+    """
+    Synthesize the sentences of the script concurrently and yield the PCM
+    back in script order, with pauses rendered as silence. Each piece is
+    yielded as soon as it and everything before it are ready.
+
+    Requests are started lazily, at most TTS_CONCURRENCY sentences ahead of
+    the consumer, so a slow consumer (a streaming client) holds back the
+    synthesis instead of letting finished audio pile up in memory.
+    """
+    items = iter(split_script(transcript))
+    ahead: deque[asyncio.Task | int] = deque()
+    synthesizing = 0  # tasks in `ahead`
+
+    def refill() -> None:
+        nonlocal synthesizing
+        while synthesizing < settings.TTS_CONCURRENCY:
+            item = next(items, None)
+            if item is None:
+                return
+            if isinstance(item, str):
+                item = asyncio.create_task(tts_pcm(item))
+                synthesizing += 1
+            ahead.append(item)
+
+    try:
+        refill()
+        while ahead:
+            item = ahead.popleft()
+            if isinstance(item, int):
+                yield silence(item)
+                continue
+            synthesizing -= 1
+            pcm = await item
+            refill()
+            yield pcm
+    finally:
+        for item in ahead:
+            if isinstance(item, asyncio.Task):
+                item.cancel()
 
 
 async def tts_to_wav(text: str) -> BytesIO:
-    resp = await async_client.audio.speech.create(
-        model="gpt-4o-mini-tts",
-        voice="nova",
-        input=text,
-        response_format="pcm",
-    )
-    pcm = await resp.aread()
+    pcm = b"".join([chunk async for chunk in tts_segments(text)])
     wav = BytesIO()
     with wave.open(wav, "wb") as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)
-        wf.setframerate(24_000)
+        wf.setnchannels(CHANNELS)
+        wf.setsampwidth(SAMPLE_WIDTH)
+        wf.setframerate(SAMPLE_RATE)
         wf.writeframes(pcm)
     wav.seek(0)
     return wav
 
 
-def mix_with_bg(voice_wav: BytesIO, bg_path: Path) -> BytesIO:
-    speech = AudioSegment.from_file(voice_wav, format="wav")
-    bg = AudioSegment.from_file(bg_path) - 15
-    if len(bg) < len(speech):
-        bg *= len(speech) // len(bg) + 1
-    final = speech.overlay(bg[: len(speech)])
+async def _mixed_pcm(transcript: str, bg_path: Path) -> AsyncIterator[bytes]:
+    mixer = StreamMixer(bg_samples(bg_path, settings.BG_CACHE_DIR))
+    async for pcm in tts_segments(transcript):
+        yield mixer.mix(pcm)
 
-    out = BytesIO()
-    final.export(out, format="mp3")
-    out.seek(0)
-    return out
 
+def cache_key(prompt: str, bg_path: Path) -> str:
+    return make_key(prompt, bg_path, voice=TTS_VOICE, model=TTS_MODEL)
 
-async def store_meditation(user_id: str, transcript: str, audio: BytesIO) -> str:
-    import time
 
-    fname = f"{user_id}_{int(time.time())}.mp3"
-    bucket = "meditations"
+def cache_object(key: str) -> str:
+    """
+    Storage name of a cacheable render. Content-addressed, so every user who
+    gets this meditation from the cache shares one object that names nobody.
+    """
+    return f"{key}.mp3"
 
-    # Check and log file size
-    audio_bytes = audio.getvalue()
-    size_bytes = len(audio_bytes)
-    size_mb = size_bytes / (1024 * 1024)
-    print(
-        f"DEBUG: [store_meditation] Audio size: {size_bytes} bytes ({size_mb:.2f} MB)"
-    )
 
-    # Enforce max file size limit
-    if size_bytes > 10 * 1024 * 1024:
-        raise ValueError("Audio file exceeds 10MB limit. Cannot store in Supabase.")
+async def cached_meditation(user_id: str, prompt: str, bg_path: Path) -> dict | None:
+    """
+    Serve a previously rendered meditation for the same prompt/background.
+    The user's `meditations` row is written in the background so the hit
+    returns straight away.
+    """
+    hit = await asyncio.to_thread(meditation_cache.get, cache_key(prompt, bg_path))
+    if hit is not None:
+        spawn(record_meditation(user_id, hit["transcript"], hit["audioUrl"]))
+    return hit
 
-    try:
-        # print(f"DEBUG: [store_meditation] Uploading {fname} to bucket {bucket}")
-        res = supabase.storage.from_(bucket).upload(
-            fname,
-            audio_bytes,
-            file_options={"content-type": "audio/mpeg"},  # Must match MP3 format
+
+class RenderFailed(Exception):
+    """A streamed render died after the response had started."""
+
+
+def _log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("streamed meditation failed", exc_info=task.exception())
+
+
+def stream_meditation(
+    user_id: str,
+    transcript: str,
+    bg_path: Path,
+    out_path: Path,
+    key: str | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    TTS -> mix -> MP3 as a stream of MP3 chunks for the response body.
+
+    Rendering runs in a task started with the body that tees every chunk to
+    `out_path` and, once the file is complete, uploads it; the upload
+    outlives the response. The queue between the task and the response is
+    bounded, so a slow client applies back-pressure. If the response closes
+    before the render is done (client gone) the task is cancelled and the
+    partial file removed; if the render fails the body raises RenderFailed,
+    so the response is aborted instead of ending as a clean, truncated 200.
+    With `key`, the finished file is added to the meditation cache.
+    """
+    queue: asyncio.Queue[bytes | BaseException | None] = asyncio.Queue(maxsize=32)
+
+    async def produce() -> None:
+        t0 = time.perf_counter()
+        try:
+            with open(out_path, "wb") as f:
+                async for chunk in encode_mp3_stream(_mixed_pcm(transcript, bg_path)):
+                    f.write(chunk)
+                    await queue.put(chunk)
+        except BaseException as e:
+            out_path.unlink(missing_ok=True)
+            if not isinstance(e, asyncio.CancelledError):
+                await queue.put(e)
+            raise
+        await queue.put(None)
+        audio_retention.track(out_path)
+        audio_url = await store_meditation(
+            user_id, transcript, out_path, cache_object(key) if key else None
         )
+        if key is not None:
+            await asyncio.to_thread(
+                meditation_cache.put,
+                key,
+                transcript,
+                audio_url,
+                out_path,
+                time.perf_counter() - t0,
+            )
 
-        public_url = supabase.storage.from_(bucket).get_public_url(fname)
+    async def body() -> AsyncIterator[bytes]:
+        # Started here rather than up front: a response that never starts
+        # streaming has nothing left running behind it.
+        producer = spawn(produce())
+        producer.add_done_callback(_log_failure)
+        rendered = False
+        try:
+            while (item := await queue.get()) is not None:
+                if isinstance(item, BaseException):
+                    raise RenderFailed(out_path.name) from item
+                yield item
+            rendered = True
+        finally:
+            if not rendered:
+                producer.cancel()  # no-op if it already failed
 
-        row = {
-            "user_id": user_id,
-            "transcript": transcript,
-            "audio_url": public_url,
-        }
-        # print(f"DEBUG: [store_meditation] Inserting row: {row}")
-        supabase.table("meditations").insert(row).execute()
-        # print("DEBUG: [store_meditation] Row inserted successfully")
+    return body()
 
-        return public_url
-    except Exception as e:
-        print(f"DEBUG: [store_meditation] Exception: {e}")
+
+async def render_meditation(
+    user_id: str,
+    prompt: str,
+    bg_path: Path,
+    on_stage: Callable[[str], None] | None = None,
+) -> dict:
+    """
+    Full pipeline: transcript -> TTS -> mix -> upload.
+    `on_stage` is called with the stage name as each stage starts
+    ("transcript", "tts", "mix", "upload") so callers can track progress.
+    The blocking stages run off the event loop (threads / the mix process pool).
+    A cache hit skips every stage.
+    """
+    hit = await cached_meditation(user_id, prompt, bg_path)
+    if hit is not None:
+        return {"transcript": hit["transcript"], "audioUrl": hit["audioUrl"]}
+    key = cache_key(prompt, bg_path)
+
+    stage = on_stage or (lambda _: None)
+    t0 = time.perf_counter()
+
+    stage("transcript")
+    transcript = await generate_transcript(prompt)
+    stage("tts")
+    wav = await tts_to_wav(transcript)
+    stage("mix")
+    mp3 = await mix_pool.mix(wav, bg_path)
+    stage("upload")
+    audio_url = await store_meditation(user_id, transcript, mp3, cache_object(key))
+    await asyncio.to_thread(
+        meditation_cache.put,
+        key,
+        transcript,
+        audio_url,
+        mp3.getbuffer(),
+        time.perf_counter() - t0,
+    )
+    return {"transcript": transcript, "audioUrl": audio_url}
+
+
+async def store_meditation(
+    user_id: str,
+    transcript: str,
+    audio: BytesIO | Path,
+    name: str | None = None,
+) -> str:
+    """
+    Upload the MP3 (streamed from the buffer or file, resumable when large)
+    and add the user's meditations row. The public URL is known up front, so
+    the insert runs while the last chunk is still uploading; if the upload
+    then fails the row is removed again, and if the insert fails the user's
+    object is deleted again.
+
+    `name` is the shared object of a cacheable render (cache_object); a
+    re-render of the same key replaces it. Without one, the object is the
+    user's own. A shared object is left in place when the insert fails:
+    other users' rows may point at it.
+    """
+    fname = name or f"{user_id}_{int(time.time())}.mp3"
+    bucket = "meditations"
+    public_url = storage_uploader.public_url(bucket, fname)
+
+    tail = asyncio.Event()
+
+    async def insert_row() -> None:
+        await tail.wait()
+        await record_meditation(user_id, transcript, public_url)
+
+    row = asyncio.create_task(insert_row())
+    try:
+        await storage_uploader.upload(
+            bucket, fname, audio, tail=tail, upsert=name is not None
+        )
+    except BaseException as e:
+        logger.warning(
+            "meditation upload failed", extra={"file": fname, "error": repr(e)}
+        )
+        row.cancel()
+        await asyncio.gather(row, return_exceptions=True)
+        if tail.is_set():
+            db = await get_async_supabase()
+            await execute(
+                db.table("meditations")
+                .delete()
+                .eq("user_id", user_id)
+                .eq("audio_url", public_url)
+            )
+        raise
+    try:
+        await row
+    except BaseException as e:
+        logger.warning(
+            "meditation row not recorded", extra={"file": fname, "error": repr(e)}
+        )
+        if name is None:
+            try:
+                await asyncio.shield(storage_uploader.delete(bucket, fname))
+            except Exception as cleanup:
+                logger.warning(
+                    "orphaned meditation upload",
+                    extra={"file": fname, "error": repr(cleanup)},
+                )
         raise
+    return public_url
+
+
+async def record_meditation(user_id: str, transcript: str, audio_url: str) -> None:
+    """Add a meditation to the user's list (/meditate/list)."""
+    db = await get_async_supabase()
+    await execute(
+        db.table("meditations").insert(
+            {"user_id": user_id, "transcript": transcript, "audio_url": audio_url}
+        )
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,185 @@
+# backend/app/services/meditation_cache.py
+"""
+Content-addressed cache of rendered meditations.
+
+A meditation is fully determined (as far as we care) by the prompt, the
+background track, and the TTS voice/model, so those are hashed into a key and
+the finished MP3 is kept under `<key>.mp3` next to a `<key>.json` sidecar
+holding the transcript, the public storage URL and how long the render took.
+A repeated request is answered from the sidecar without touching the LLM,
+TTS, mixer or storage.
+
+The files live in AUDIO_DIR (the same directory the streaming route writes
+to and /meditate/download serves from) and the total MP3 size is kept under
+`max_bytes` by evicting the least recently used entries. Recency is the MP3's atime, set on every hit
+(mtime is left alone so download ETags stay valid), so the LRU order
+survives restarts and is shared by all worker processes. audio_retention
+applies the directory-wide quota and age limit on top of this.
+
+The stored URL points at a content-addressed storage object
+(`<key>.mp3`, see meditation.cache_object), never at the first requester's
+own upload. Every method does blocking file IO: call them off the event
+loop (asyncio.to_thread). A lock keeps the index consistent across threads.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from app.core.config import settings
+from app.services.audio_retention import audio_retention
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case, surrounding quotes/punctuation and whitespace don't change the meditation."""
+    return re.sub(r"\s+", " ", prompt).strip().strip("\"'.!?").strip().casefold()
+
+
+# Bumped when entries stop being valid: 2 = content-addressed storage URLs.
+KEY_VERSION = 2
+
+
+def make_key(prompt: str, background: Path, voice: str, model: str) -> str:
+    ident = json.dumps(
+        [KEY_VERSION, normalize_prompt(prompt), Path(background).name, voice, model],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(ident.encode()).hexdigest()
+
+
+class MeditationCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.dir = Path(directory)
+        self.max_bytes = max_bytes
+        self._index: OrderedDict[str, int] | None = None  # key -> mp3 bytes, LRU first
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0  # MP3 bytes not re-rendered / re-uploaded
+        self.render_secs_saved = 0.0
+
+    def _load(self) -> OrderedDict[str, int]:
+        with self._lock:  # reentrant: callers may already hold it
+            if self._index is None:
+                self.dir.mkdir(parents=True, exist_ok=True)
+                entries = []
+                for meta in self.dir.glob("*.json"):
+                    mp3 = meta.with_suffix(".mp3")
+                    try:
+                        st = mp3.stat()
+                    except FileNotFoundError:
+                        meta.unlink(missing_ok=True)
+                        continue
+                    entries.append((st.st_atime, meta.stem, st.st_size))
+                entries.sort()
+                self._index = OrderedDict((key, size) for _, key, size in entries)
+            return self._index
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(self._load().values())
+
+    def path(self, key: str) -> Path:
+        return self.dir / f"{key}.mp3"
+
+    def get(self, key: str) -> dict | None:
+        """{"transcript", "audioUrl", "path", "render_secs"} or None on a miss."""
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key: str) -> dict | None:
+        index = self._load()
+        meta_path = self.dir / f"{key}.json"
+        # Not in our index, but another worker may have rendered it since.
+        if key not in index and not meta_path.exists():
+            self.misses += 1
+            return None
+        try:
+            meta = json.loads(meta_path.read_text())
+            st = self.path(key).stat()
+            # Persist recency for other workers/restarts (atime only).
+            os.utime(self.path(key), ns=(time.time_ns(), st.st_mtime_ns))
+            index[key] = st.st_size
+        except (FileNotFoundError, ValueError):
+            # Evicted by another worker (or a torn sidecar): treat as a miss.
+            index.pop(key, None)
+            self.misses += 1
+            return None
+
+        index.move_to_end(key)
+        self.hits += 1
+        self.bytes_saved += index[key]
+        self.render_secs_saved += meta.get("render_secs", 0.0)
+        return {**meta, "path": self.path(key)}
+
+    def put(
+        self,
+        key: str,
+        transcript: str,
+        audio_url: str,
+        mp3: bytes | memoryview | Path,
+        render_secs: float = 0.0,
+    ) -> None:
+        """Store a finished meditation."""
+        path = self.path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        if isinstance(mp3, Path):
+            try:
+                os.link(mp3, tmp)  # already on disk: share the inode, no copy
+            except OSError:
+                tmp.write_bytes(mp3.read_bytes())
+        else:
+            tmp.write_bytes(mp3)
+        os.replace(tmp, path)
+
+        meta = {
+            "transcript": transcript,
+            "audioUrl": audio_url,
+            "render_secs": round(render_secs, 3),
+        }
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.json.tmp")
+        tmp.write_text(json.dumps(meta, ensure_ascii=False))
+        os.replace(tmp, path.with_suffix(".json"))
+
+        with self._lock:
+            index = self._load()
+            index[key] = path.stat().st_size
+            index.move_to_end(key)
+            self._evict()
+        audio_retention.track(path)
+
+    def _evict(self) -> None:
+        index = self._load()
+        total = sum(index.values())
+        while total > self.max_bytes and len(index) > 1:
+            key, size = index.popitem(last=False)
+            (self.dir / f"{key}.json").unlink(missing_ok=True)
+            self.path(key).unlink(missing_ok=True)
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = len(self._load())
+        return {
+            "entries": entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "render_secs_saved": round(self.render_secs_saved, 3),
+        }
+
+
+meditation_cache = MeditationCache(settings.AUDIO_DIR, settings.MEDITATION_CACHE_BYTES)
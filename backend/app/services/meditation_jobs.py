@@ -0,0 +1,393 @@
+# backend/app/services/meditation_jobs.py
+"""
+Background job queue for meditation generation.
+
+POST /meditate/jobs persists a job and returns its id straight away; a fixed
+pool of asyncio workers runs `render_meditation` and records the current
+stage, per-stage durations and the final audio URL. Jobs live in a local
+SQLite file, so anything queued or mid-run when the process dies is picked
+up again on the next start.
+
+Several processes (uvicorn --workers N, or a restart while the old process
+is still draining) can share the file. A worker claims a job atomically
+(queued -> running, with its process as owner and a lease it keeps renewing),
+so each job renders once. A running job is only recovered once its lease
+has expired, and a job that kept killing its worker is failed after
+MEDITATION_JOB_MAX_ATTEMPTS claims.
+
+All SQLite access goes through one thread per process (JobStore is only
+ever called from it), so the loop never blocks on a commit and the
+connection is never used from two threads at once.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from uuid import uuid4
+
+from app.core.config import settings
+from app.core.metrics import current_route
+from app.services.meditation import render_meditation
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("transcript", "tts", "mix", "upload")
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _log_db_error(future: Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(
+            "meditation job store write failed",
+            exc_info=future.exception(),
+        )
+
+
+class JobStore:
+    """Tiny SQLite-backed table of jobs (one row per job)."""
+
+    # Added after the first release; created on older files by _upgrade.
+    COLUMNS = {
+        "owner": "text",
+        "lease_until": "real",
+        "attempts": "integer not null default 0",
+    }
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("pragma journal_mode=wal")
+        self._db.execute("""
+            create table if not exists jobs (
+                id          text primary key,
+                user_id     text not null,
+                prompt      text not null,
+                bg_path     text not null,
+                status      text not null,  -- queued | running | done | failed
+                stage       text,
+                durations   text not null default '{}',
+                transcript  text,
+                audio_url   text,
+                error       text,
+                created_at  real not null,
+                updated_at  real not null
+            )
+            """)
+        self._upgrade()
+        self._db.commit()
+
+    def _upgrade(self) -> None:
+        have = {r["name"] for r in self._db.execute("pragma table_info(jobs)")}
+        for name, decl in self.COLUMNS.items():
+            if name not in have:
+                self._db.execute(f"alter table jobs add column {name} {decl}")
+
+    def add(self, user_id: str, prompt: str, bg_path: Path) -> str:
+        job_id = uuid4().hex
+        now = time.time()
+        self._db.execute(
+            "insert into jobs (id, user_id, prompt, bg_path, status, created_at, updated_at)"
+            " values (?, ?, ?, ?, 'queued', ?, ?)",
+            (job_id, user_id, prompt, str(bg_path), now, now),
+        )
+        self._db.commit()
+        return job_id
+
+    def update(self, job_id: str, owner: str, **fields) -> bool:
+        """Update a job this process owns; False if it lost the claim."""
+        if "durations" in fields:
+            fields["durations"] = json.dumps(fields["durations"])
+        fields["updated_at"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        cur = self._db.execute(
+            f"update jobs set {cols} where id = ? and owner = ?",
+            (*fields.values(), job_id, owner),
+        )
+        self._db.commit()
+        return cur.rowcount == 1
+
+    def claim(self, job_id: str, owner: str, lease: float, max_attempts: int) -> bool:
+        now = time.time()
+        cur = self._db.execute(
+            "update jobs set status = 'running', owner = ?, lease_until = ?,"
+            " attempts = attempts + 1, updated_at = ?"
+            " where id = ? and status = 'queued' and attempts < ?",
+            (owner, now + lease, now, job_id, max_attempts),
+        )
+        self._db.commit()
+        return cur.rowcount == 1
+
+    def renew(self, job_id: str, owner: str, lease: float) -> bool:
+        cur = self._db.execute(
+            "update jobs set lease_until = ? where id = ? and owner = ?"
+            " and status = 'running'",
+            (time.time() + lease, job_id, owner),
+        )
+        self._db.commit()
+        return cur.rowcount == 1
+
+    def release(self, job_ids: list[str], owner: str) -> None:
+        """Hand unfinished jobs back (shutdown); the claim doesn't count."""
+        self._db.executemany(
+            "update jobs set status = 'queued', owner = null, lease_until = null,"
+            " stage = null, attempts = max(attempts - 1, 0)"
+            " where id = ? and owner = ? and status = 'running'",
+            [(job_id, owner) for job_id in job_ids],
+        )
+        self._db.commit()
+
+    def get(self, job_id: str) -> dict | None:
+        row = self._db.execute("select * from jobs where id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["durations"] = json.loads(job["durations"])
+        return job
+
+    def recover(self, max_attempts: int) -> list[str]:
+        """
+        Re-queue running jobs whose lease expired (their process died), fail
+        those out of attempts, and return the ids of all queued jobs, oldest
+        first. Claims are atomic, so queued ids another process also holds
+        are harmless.
+        """
+        now = time.time()
+        self._db.execute(
+            "update jobs set status = 'failed', stage = null, updated_at = ?,"
+            " error = 'gave up after ' || attempts || ' attempts'"
+            " where attempts >= ? and (status = 'queued'"
+            " or (status = 'running' and coalesce(lease_until, 0) < ?))",
+            (now, max_attempts, now),
+        )
+        self._db.execute(
+            "update jobs set status = 'queued', owner = null, lease_until = null,"
+            " stage = null, updated_at = ?"
+            " where status = 'running' and coalesce(lease_until, 0) < ?",
+            (now, now),
+        )
+        self._db.commit()
+        rows = self._db.execute(
+            "select id from jobs where status = 'queued' order by created_at"
+        ).fetchall()
+        return [r["id"] for r in rows]
+
+
+class MeditationJobQueue:
+    def __init__(
+        self,
+        db_path: str,
+        workers: int,
+        maxsize: int,
+        lease: float,
+        max_attempts: int,
+    ):
+        self.db_path = db_path
+        self.workers = workers
+        self.maxsize = maxsize
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.store: JobStore | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._queue: asyncio.Queue[str] | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._waiting: set[str] = set()  # ids in _queue
+        self._claimed: set[str] = set()  # jobs this process is rendering
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.lost_claims = 0
+        # stage -> [count, total seconds, max seconds]
+        self._stage_stats = {s: [0, 0.0, 0.0] for s in STAGES}
+
+    async def _db(self, method: str, *args, **kwargs):
+        """Run a JobStore method on the store's thread."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, partial(getattr(self.store, method), *args, **kwargs)
+        )
+
+    def _db_nowait(self, method: str, *args, **kwargs) -> None:
+        """Queue a write behind earlier ones without waiting (sync callbacks)."""
+        future = self._executor.submit(getattr(self.store, method), *args, **kwargs)
+        future.add_done_callback(_log_db_error)
+
+    async def start(self) -> None:
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="meditation-jobs")
+        loop = asyncio.get_running_loop()
+        self.store = await loop.run_in_executor(self._executor, JobStore, self.db_path)
+        # Re-queued jobs may exceed maxsize; only new submissions are bounded.
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"meditation-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._tasks.append(
+            asyncio.create_task(self._recover(), name="meditation-recovery")
+        )
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._claimed:
+            # Interrupted renders go straight back to the queue for whichever
+            # process starts (or is still running) next.
+            await self._db("release", list(self._claimed), self.owner)
+            self._claimed.clear()
+        self._executor.shutdown(wait=True)
+
+    async def _recover(self) -> None:
+        """Pick up queued jobs and jobs whose owner's lease ran out, periodically."""
+        while True:
+            for job_id in await self._db("recover", self.max_attempts):
+                if job_id not in self._waiting and job_id not in self._claimed:
+                    self._enqueue(job_id)
+            await asyncio.sleep(self.lease)
+
+    async def submit(self, user_id: str, prompt: str, bg_path: Path) -> str:
+        if self._queue.qsize() >= self.maxsize:
+            raise QueueFull()
+        job_id = await self._db("add", user_id, prompt, bg_path)
+        self._enqueue(job_id)
+        return job_id
+
+    def _enqueue(self, job_id: str) -> None:
+        self._waiting.add(job_id)
+        self._queue.put_nowait(job_id)
+
+    async def get(self, job_id: str) -> dict | None:
+        return await self._db("get", job_id)
+
+    async def _worker(self) -> None:
+        current_route.set("job:meditation")  # metrics label for render stages
+        while True:
+            job_id = await self._queue.get()
+            self._waiting.discard(job_id)
+            self.busy += 1
+            try:
+                if await self._db(
+                    "claim", job_id, self.owner, self.lease, self.max_attempts
+                ):
+                    self._claimed.add(job_id)
+                    await self._run(job_id)
+                    self._claimed.discard(job_id)
+            except Exception:
+                # Bookkeeping failure: keep the worker alive; the row stays
+                # running, so the job is recovered once its lease expires.
+                self._claimed.discard(job_id)
+                logger.exception(
+                    "meditation job worker error", extra={"job_id": job_id}
+                )
+            finally:
+                self.busy -= 1
+                self._queue.task_done()
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            if not await self._db("renew", job_id, self.owner, self.lease):
+                self.lost_claims += 1
+                logger.warning("meditation job lease lost", extra={"job_id": job_id})
+                return
+
+    async def _run(self, job_id: str) -> None:
+        job = await self._db("get", job_id)
+
+        durations: dict[str, float] = {}
+        current = {"stage": None, "t0": time.perf_counter()}
+
+        def close_stage() -> None:
+            if current["stage"] is None:
+                return
+            took = time.perf_counter() - current["t0"]
+            durations[current["stage"]] = round(took, 3)
+            stats = self._stage_stats[current["stage"]]
+            stats[0] += 1
+            stats[1] += took
+            stats[2] = max(stats[2], took)
+
+        def on_stage(stage: str) -> None:
+            close_stage()
+            current["stage"], current["t0"] = stage, time.perf_counter()
+            self._db_nowait(
+                "update", job_id, self.owner, stage=stage, durations=dict(durations)
+            )
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result = await render_meditation(
+                job["user_id"], job["prompt"], Path(job["bg_path"]), on_stage
+            )
+        except asyncio.CancelledError:
+            # Shutdown: stop() hands the job back to the queue.
+            raise
+        except Exception as e:
+            close_stage()
+            self.failed += 1
+            logger.warning(
+                "meditation job failed",
+                extra={"job_id": job_id, "stage": current["stage"], "error": repr(e)},
+            )
+            await self._db(
+                "update",
+                job_id,
+                self.owner,
+                status="failed",
+                error=str(e),
+                durations=durations,
+            )
+            return
+        finally:
+            heartbeat.cancel()
+
+        close_stage()
+        self.completed += 1
+        await self._db(
+            "update",
+            job_id,
+            self.owner,
+            status="done",
+            stage=None,
+            durations=durations,
+            transcript=result["transcript"],
+            audio_url=result["audioUrl"],
+        )
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_limit": self.maxsize,
+            "workers": self.workers,
+            "busy_workers": self.busy,
+            "completed": self.completed,
+            "failed": self.failed,
+            "lost_claims": self.lost_claims,
+            "stages": {
+                stage: {
+                    "count": n,
+                    "avg_secs": round(total / n, 3) if n else None,
+                    "max_secs": round(peak, 3),
+                }
+                for stage, (n, total, peak) in self._stage_stats.items()
+            },
+        }
+
+
+meditation_jobs = MeditationJobQueue(
+    settings.MEDITATION_JOBS_DB,
+    workers=settings.MEDITATION_WORKERS,
+    maxsize=settings.MEDITATION_QUEUE_SIZE,
+    lease=settings.MEDITATION_JOB_LEASE,
+    max_attempts=settings.MEDITATION_JOB_MAX_ATTEMPTS,
+)
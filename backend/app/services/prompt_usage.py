@@ -0,0 +1,37 @@
+# backend/app/services/prompt_usage.py
+from collections import defaultdict
+
+
+class PromptUsage:
+    """
+    Input tokens billed per provider, and how many of them the provider
+    served from its prompt cache (OpenAI `cached_tokens`, Gemini
+    `cached_content_token_count`), as reported in each response's usage.
+    """
+
+    def __init__(self):
+        self._data: dict[str, dict[str, int]] = defaultdict(
+            lambda: {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0}
+        )
+
+    def record(self, provider: str, prompt_tokens: int, cached_tokens: int) -> None:
+        entry = self._data[provider]
+        entry["calls"] += 1
+        entry["prompt_tokens"] += prompt_tokens or 0
+        entry["cached_tokens"] += cached_tokens or 0
+
+    def stats(self) -> dict:
+        return {
+            provider: {
+                **entry,
+                "cached_ratio": (
+                    entry["cached_tokens"] / entry["prompt_tokens"]
+                    if entry["prompt_tokens"]
+                    else 0.0
+                ),
+            }
+            for provider, entry in self._data.items()
+        }
+
+
+prompt_usage = PromptUsage()
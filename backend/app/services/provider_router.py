@@ -0,0 +1,406 @@
+# backend/app/services/provider_router.py
+"""
+Latency-aware routing between LLM providers (OpenAI, Gemini).
+
+Callers hand the router one zero-argument coroutine factory per provider in
+preference order. The router
+
+  * skips providers whose circuit breaker is open (too many recent errors),
+    letting a single probe through once the cooldown has passed;
+  * falls back to the next provider when one raises;
+  * for token streams, falls back only before the first token;
+  * optionally hedges: if the first provider hasn't answered within its own
+    rolling p95 for this workload, the second is started as well and
+    whichever succeeds first wins (the other is cancelled).
+
+Latency is tracked per (workload, provider), since a chat answer and a
+meditation script have very different timings. Breakers are per provider,
+since an outage affects every workload.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import observe_stage
+
+T = TypeVar("T")
+
+
+class ProvidersUnavailable(Exception):
+    """Every provider failed or has its breaker open."""
+
+
+class LatencyWindow:
+    """Rolling latency samples and outcomes of one provider on one workload."""
+
+    def __init__(self, size: int):
+        self.latencies: deque[float] = deque(maxlen=size)
+        self.outcomes: deque[bool] = deque(maxlen=size)
+        self.calls = 0
+        self.errors = 0
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.calls += 1
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+        else:
+            self.errors += 1
+
+    def percentile(self, q: float) -> float | None:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def stats(self) -> dict:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate, 3),
+            "p50_secs": round(p50, 3) if p50 is not None else None,
+            "p95_secs": round(p95, 3) if p95 is not None else None,
+        }
+
+
+class CircuitBreaker:
+    """
+    closed -> open after repeated failures -> half-open probe after `cooldown`.
+
+    `allow()` hands out a ticket that the caller passes back to `record()` or
+    `release()`. While the breaker is open only the probe's ticket counts:
+    outcomes of calls admitted before it opened are ignored, so a slow call
+    finishing late can't close it. Used from the event loop and from
+    threadpool threads (`call_sync`), hence the lock.
+    """
+
+    def __init__(self, failures: int, error_rate: float, window: int, cooldown: float):
+        self.max_failures = failures
+        self.max_error_rate = error_rate
+        self.cooldown = cooldown
+        self.outcomes: deque[bool] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self.probe: int | None = None  # ticket of the half-open trial call
+        self.trips = 0
+        self._tickets = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> int | None:
+        """A ticket for one call, or None if the breaker rejects it."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return next(self._tickets)
+            if state == "half_open" and self.probe is None:
+                self.probe = next(self._tickets)  # one trial request at a time
+                return self.probe
+            return None
+
+    def record(self, ticket: int, ok: bool) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                if ticket != self.probe:
+                    return  # admitted before the breaker opened
+                self.probe = None
+                if ok:
+                    self.opened_at, self.consecutive_failures = None, 0
+                    self.outcomes.clear()
+                else:
+                    self.opened_at = time.monotonic()
+                    self.trips += 1
+                return
+
+            self.outcomes.append(ok)
+            if ok:
+                self.consecutive_failures = 0
+                return
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.max_failures or (
+                len(self.outcomes) == self.outcomes.maxlen
+                and self.outcomes.count(False) / len(self.outcomes)
+                >= self.max_error_rate
+            ):
+                self.opened_at = time.monotonic()
+                self.trips += 1
+
+    def release(self, ticket: int) -> None:
+        """A probe that ended without an outcome (cancelled) frees the slot."""
+        with self._lock:
+            if ticket == self.probe:
+                self.probe = None
+
+
+class ProviderRouter:
+    def __init__(
+        self,
+        window: int,
+        hedge: bool,
+        hedge_min_samples: int,
+        breaker_failures: int,
+        breaker_error_rate: float,
+        breaker_window: int,
+        breaker_cooldown: float,
+    ):
+        self.window = window
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self._breaker_args = (
+            breaker_failures,
+            breaker_error_rate,
+            breaker_window,
+            breaker_cooldown,
+        )
+        self._latency: dict[tuple[str, str], LatencyWindow] = {}
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()  # get-or-create from threadpool threads
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        if provider not in self._breakers:
+            with self._lock:
+                if provider not in self._breakers:
+                    self._breakers[provider] = CircuitBreaker(*self._breaker_args)
+        return self._breakers[provider]
+
+    def latency(self, workload: str, provider: str) -> LatencyWindow:
+        key = (workload, provider)
+        if key not in self._latency:
+            with self._lock:
+                if key not in self._latency:
+                    self._latency[key] = LatencyWindow(self.window)
+        return self._latency[key]
+
+    def record(
+        self, workload: str, provider: str, ticket: int, latency: float, ok: bool
+    ) -> None:
+        self.latency(workload, provider).record(latency, ok)
+        self.breaker(provider).record(ticket, ok)
+        observe_stage("llm", f"{provider}:{workload}", latency)
+
+    async def _timed(
+        self,
+        workload: str,
+        provider: str,
+        ticket: int,
+        call: Callable[[], Awaitable[T]],
+    ) -> T:
+        t0 = time.perf_counter()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            self.breaker(provider).release(ticket)
+            raise
+        except Exception:
+            self.record(workload, provider, ticket, time.perf_counter() - t0, False)
+            raise
+        self.record(workload, provider, ticket, time.perf_counter() - t0, True)
+        return result
+
+    def _hedge_delay(self, workload: str, provider: str) -> float | None:
+        window = self.latency(workload, provider)
+        if not self.hedge or len(window.latencies) < self.hedge_min_samples:
+            return None
+        return window.percentile(0.95)
+
+    def _next(self, order: list[str]) -> tuple[str, int] | None:
+        """
+        Pop providers off `order` until one whose breaker lets a call through;
+        returns it with the breaker ticket.
+        """
+        while order:
+            provider = order.pop(0)
+            ticket = self.breaker(provider).allow()
+            if ticket is not None:
+                return provider, ticket
+        return None
+
+    async def call(
+        self,
+        workload: str,
+        calls: dict[str, Callable[[], Awaitable[T]]],
+    ) -> T:
+        """
+        Run the first healthy provider in `calls` (dict order = preference),
+        hedging/falling back to the next one. Raises ProvidersUnavailable if
+        none succeeds.
+        """
+        _, result = await self.call_with_provider(workload, calls)
+        return result
+
+    async def call_with_provider(
+        self,
+        workload: str,
+        calls: dict[str, Callable[[], Awaitable[T]]],
+    ) -> tuple[str, T]:
+        """`call`, also returning which provider answered."""
+        order = list(calls)
+        errors: list[str] = []
+        admitted = self._next(order)
+        while admitted is not None:
+            primary, ticket = admitted
+            delay = self._hedge_delay(workload, primary) if order else None
+            first = asyncio.ensure_future(
+                self._timed(workload, primary, ticket, calls[primary])
+            )
+            pending = {first: (primary, ticket)}
+            # Everything from here on is inside the try, so a caller cancelled
+            # during the hedge delay still cancels the calls it started.
+            try:
+                if delay is not None:
+                    done, _ = await asyncio.wait({first}, timeout=delay)
+                    if not done and (hedged := self._next(order)) is not None:
+                        secondary, ticket = hedged
+                        self.hedges += 1
+                        hedge = asyncio.ensure_future(
+                            self._timed(workload, secondary, ticket, calls[secondary])
+                        )
+                        pending[hedge] = (secondary, ticket)
+                while pending:
+                    done, _ = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        provider, _ = pending.pop(task)
+                        if task.exception() is None:
+                            if task is not first:
+                                self.hedge_wins += 1
+                            return provider, task.result()
+                        errors.append(f"{provider}: {task.exception()!r}")
+            finally:
+                for task, (provider, ticket) in pending.items():
+                    task.cancel()
+                    # A task cancelled before it ever ran can't release its
+                    # own probe ticket; releasing twice is harmless.
+                    self.breaker(provider).release(ticket)
+            admitted = self._next(order)
+            if admitted is not None:
+                self.fallbacks += 1
+        raise ProvidersUnavailable("; ".join(errors) or "all circuit breakers open")
+
+    def call_sync(self, workload: str, calls: dict[str, Callable[[], T]]) -> T:
+        """Blocking variant of `call`: breakers and fallback, no hedging."""
+        _, result = self.call_sync_with_provider(workload, calls)
+        return result
+
+    def call_sync_with_provider(
+        self, workload: str, calls: dict[str, Callable[[], T]]
+    ) -> tuple[str, T]:
+        """`call_sync`, also returning which provider answered."""
+        order = list(calls)
+        errors: list[str] = []
+        while (admitted := self._next(order)) is not None:
+            provider, ticket = admitted
+            t0 = time.perf_counter()
+            try:
+                result = calls[provider]()
+            except Exception as e:
+                self.record(workload, provider, ticket, time.perf_counter() - t0, False)
+                errors.append(f"{provider}: {e!r}")
+                if order:
+                    self.fallbacks += 1
+                continue
+            self.record(workload, provider, ticket, time.perf_counter() - t0, True)
+            return provider, result
+        raise ProvidersUnavailable("; ".join(errors) or "all circuit breakers open")
+
+    async def stream(
+        self,
+        workload: str,
+        streams: dict[str, Callable[[], AsyncIterator[T]]],
+    ) -> AsyncIterator[T]:
+        """
+        Token-stream variant of `call`. Falls back to the next provider only
+        while nothing has been yielded yet (no hedging); once tokens flow, an
+        error propagates. Latency is time to first token.
+        """
+        async for _, item in self.stream_with_provider(workload, streams):
+            yield item
+
+    async def stream_with_provider(
+        self,
+        workload: str,
+        streams: dict[str, Callable[[], AsyncIterator[T]]],
+    ) -> AsyncIterator[tuple[str, T]]:
+        """`stream`, each item paired with the provider producing it."""
+        order = list(streams)
+        errors: list[str] = []
+        while (admitted := self._next(order)) is not None:
+            provider, ticket = admitted
+            t0 = time.perf_counter()
+            started = False
+            try:
+                async for item in streams[provider]():
+                    if not started:
+                        started = True
+                        first_token = time.perf_counter() - t0
+                        self.latency(workload, provider).record(first_token, True)
+                        observe_stage("llm", f"{provider}:{workload}", first_token)
+                    yield provider, item
+            except (asyncio.CancelledError, GeneratorExit):
+                self.breaker(provider).release(ticket)
+                raise
+            except Exception as e:
+                if started:
+                    self.breaker(provider).record(ticket, False)
+                    raise
+                self.record(workload, provider, ticket, time.perf_counter() - t0, False)
+                errors.append(f"{provider}: {e!r}")
+            else:
+                if started:
+                    self.breaker(provider).record(ticket, True)
+                    return
+                self.record(workload, provider, ticket, time.perf_counter() - t0, False)
+                errors.append(f"{provider}: empty stream")
+            if order:
+                self.fallbacks += 1
+        raise ProvidersUnavailable("; ".join(errors) or "all circuit breakers open")
+
+    def stats(self) -> dict:
+        return {
+            "hedging": self.hedge,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+            "breakers": {
+                p: {"state": b.state, "trips": b.trips}
+                for p, b in self._breakers.items()
+            },
+            "latency": {
+                f"{workload}:{provider}": window.stats()
+                for (workload, provider), window in self._latency.items()
+            },
+        }
+
+
+provider_router = ProviderRouter(
+    window=settings.ROUTER_WINDOW,
+    hedge=settings.ROUTER_HEDGE,
+    hedge_min_samples=settings.ROUTER_HEDGE_MIN_SAMPLES,
+    breaker_failures=settings.ROUTER_BREAKER_FAILURES,
+    breaker_error_rate=settings.ROUTER_BREAKER_ERROR_RATE,
+    breaker_window=settings.ROUTER_BREAKER_WINDOW,
+    breaker_cooldown=settings.ROUTER_BREAKER_COOLDOWN,
+)
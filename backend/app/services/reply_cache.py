@@ -0,0 +1,109 @@
+# backend/app/services/reply_cache.py
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").casefold()
+
+
+class ReplyCache:
+    """
+    In-process LRU + TTL cache of chat replies.
+
+    The key covers everything the provider sees: the model, a hash of the
+    session's log digest (derived from its logs snapshot, so new logs mean a
+    new session and new keys), the normalized question, the rolling summary
+    of older turns and the last `history_turns` turns of the prompt window.
+    A hit skips the provider entirely; the provider latency the entry
+    originally cost is counted as saved. Callers key and `put` by the
+    provider that actually answered, which after a fallback is not the one
+    requested.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, history_turns: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.history_turns = history_turns
+        # key -> (expires_at, reply, provider latency in seconds)
+        self._data: OrderedDict[str, tuple[float, str, float]] = OrderedDict()
+        # model -> [hits, misses, seconds saved, replies stored, seconds they cost]
+        self._providers: dict[str, list] = {}
+
+    def key(
+        self,
+        model: str,
+        digest: str,
+        history: list,
+        question: str,
+        summary: str | None = None,
+    ) -> str:
+        window = history[-self.history_turns :] if self.history_turns else []
+        ident = json.dumps(
+            [
+                model,
+                hashlib.sha256(digest.encode()).hexdigest(),
+                normalize_question(question),
+                [[t["role"], t["content"]] for t in window],
+                summary or "",
+            ],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(ident.encode()).hexdigest()
+
+    def _counters(self, model: str) -> list:
+        return self._providers.setdefault(model, [0, 0, 0.0, 0, 0.0])
+
+    def get(self, model: str, key: str) -> str | None:
+        counters = self._counters(model)
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            counters[1] += 1
+            return None
+        self._data.move_to_end(key)
+        counters[0] += 1
+        counters[2] += entry[2]
+        return entry[1]
+
+    def put(self, model: str, key: str, reply: str, latency: float) -> None:
+        counters = self._counters(model)
+        counters[3] += 1
+        counters[4] += latency
+        self._data[key] = (time.monotonic() + self.ttl, reply, latency)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        providers = {}
+        for model, (hits, misses, saved, stored, spent) in self._providers.items():
+            lookups = hits + misses
+            providers[model] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "latency_saved_secs": round(saved, 3),
+                "stored": stored,
+                "avg_provider_secs": round(spent / stored, 3) if stored else None,
+            }
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "history_turns": self.history_turns,
+            "providers": providers,
+        }
+
+
+reply_cache = ReplyCache(
+    settings.REPLY_CACHE_MAXSIZE,
+    settings.REPLY_CACHE_TTL,
+    settings.REPLY_CACHE_HISTORY_TURNS,
+)
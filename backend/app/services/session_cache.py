@@ -0,0 +1,98 @@
+# backend/app/services/session_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+
+
+class SessionCache:
+    """
+    In-process LRU + TTL cache of chat session state ({"logs", "digest", "history"}),
+    keyed by (user_id, session_id). Sits in front of AsyncSessionStore so a
+    chat turn can be served from memory; writes still go to the database.
+
+    The cache is per worker process: entries expire after `ttl` seconds so a
+    session touched by another worker is re-read reasonably soon. The sync
+    chat route invalidates from threadpool threads, so every access to the
+    map holds a lock.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[tuple[str, str], tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, user_id: str, sid: str) -> dict | None:
+        """Return a copy of the cached state, or None on miss/expiry."""
+        key = (user_id, sid)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, state = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return {**state, "history": list(state["history"])}
+
+    def put(self, user_id: str, sid: str, state: dict) -> None:
+        key = (user_id, sid)
+        entry = (
+            time.monotonic() + self.ttl,
+            {**state, "history": list(state["history"])},
+        )
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def extend(self, user_id: str, sid: str, messages: list[dict]) -> list | None:
+        """
+        Append messages to a cached history in place (no TTL refresh).
+        Returns a copy of the updated history, or None if the session isn't
+        cached.
+        """
+        with self._lock:
+            entry = self._data.get((user_id, sid))
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            entry[1]["history"].extend(messages)
+            return list(entry[1]["history"])
+
+    def invalidate(self, user_id: str, sid: str | None = None) -> None:
+        """Drop one session, or every cached session of the user."""
+        with self._lock:
+            if sid is not None:
+                self._data.pop((user_id, sid), None)
+                return
+            for key in [k for k in self._data if k[0] == user_id]:
+                del self._data[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+session_cache = SessionCache(settings.SESSION_CACHE_MAXSIZE, settings.SESSION_CACHE_TTL)
@@ -1,21 +1,98 @@
 # backend/app/services/session_store.py
+"""
+Chat session storage.
+
+A session is one `chat_sessions` row (logs snapshot, plus the prompt digest
+built from it once at creation, the provider-side context cache handle and
+the rolling summary of older turns) and its turns, stored one-per-row in
+`chat_messages`, which cascade-delete with the session (schema in
+supabase/migrations/20261018100*_*.sql).
+Appending a turn is a constant-size insert; nothing re-uploads the history.
+Loading a session reads only its newest CHAT_HISTORY_LOAD_TURNS turns
+(an index range scan on (session_id, id)) plus the total count.
+`history_base` is the position of the first loaded turn in the full
+history, so positions such as `summarized` stay meaningful.
+
+Sessions created before the migration still carry their turns in the legacy
+`chat_sessions.history` blob; both stores move them into `chat_messages` the
+first time they are read, before any turn is appended
+(supabase_client.migrate_history_blob).
+"""
+
+import asyncio
 import json
+import logging
+import weakref
 from uuid import uuid4
 
-from app.services.supabase_client import supabase
+from app.core.config import settings
+from app.services.background import spawn
+from app.services.log_digest import build_logs_digest
+from app.services.session_cache import session_cache
+from app.services.supabase_client import (
+    chat_message_rows,
+    execute,
+    get_async_supabase,
+    get_supabase,
+    migrate_history_blob,
+    migrate_history_blob_sync,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _decode_logs(row: dict) -> dict:
+    return row["logs"] if isinstance(row["logs"], dict) else json.loads(row["logs"])
+
+
+def _decode_digest(row: dict, logs: dict) -> str:
+    # Sessions created before the digest column existed get one on read.
+    return row.get("digest") or build_logs_digest(logs)
+
+
+def _decode_history(row: dict) -> list:
+    history = row.get("history")
+    if not history:
+        return []
+    return history if isinstance(history, list) else json.loads(history)
+
+
+def _tail(res) -> tuple[list, int]:
+    """(turns oldest first, history_base) from a newest-first, counted read."""
+    turns = list(reversed(res.data or []))
+    total = res.count if res.count is not None else len(turns)
+    return turns, total - len(turns)
+
+
+def _session(row: dict, history: list, base: int) -> dict:
+    logs = _decode_logs(row)
+    return {
+        "logs": logs,
+        "digest": _decode_digest(row, logs),
+        "history": history,
+        "history_base": base,
+        "context_cache": row.get("context_cache"),
+        "summary": row.get("summary"),
+        "summarized": row.get("summarized") or 0,
+    }
 
 
 class SessionStore:
     """
     Supabase-backed session store for managing user chat sessions.
+    Blocking variant, kept for the sync chat route (see /chat/message/sync).
     """
 
     @classmethod
     def create(cls, user_id: str, logs: dict) -> str:
+        supabase = get_supabase()
         sid = str(uuid4())
+        digest = build_logs_digest(logs)
+        session_cache.invalidate(user_id)
 
         # Remove any previous session for this user
         supabase.table("chat_sessions").delete().eq("user_id", user_id).execute()
+        supabase.table("chat_messages").delete().eq("user_id", user_id).execute()
 
         # Insert new session row
         supabase.table("chat_sessions").insert(
@@ -23,6 +100,7 @@ class SessionStore:
                 "user_id": user_id,
                 "session_id": sid,
                 "logs": json.dumps(logs),
+                "digest": digest,
                 "history": json.dumps([]),
             }
         ).execute()
@@ -31,8 +109,9 @@ class SessionStore:
     @classmethod
     def get(cls, user_id: str, sid: str) -> dict | None:
         res = (
-            supabase.table("chat_sessions")
-            .select("logs,history")
+            get_supabase()
+            .table("chat_sessions")
+            .select("logs,digest,history,context_cache,summary,summarized")
             .eq("user_id", user_id)
             .eq("session_id", sid)
             .single()
@@ -41,55 +120,211 @@ class SessionStore:
         if not res or not res.data:
             return None
 
-        import json
-
-        row = res.data
-        return {
-            "logs": (
-                row["logs"]
-                if isinstance(row["logs"], dict)
-                else json.loads(row["logs"])
-            ),
-            "history": (
-                row["history"]
-                if isinstance(row["history"], list)
-                else json.loads(row["history"])
-            ),
-        }
+        msgs = (
+            get_supabase()
+            .table("chat_messages")
+            .select("role,content", count="exact")
+            .eq("session_id", sid)
+            .order("id", desc=True)
+            .limit(settings.CHAT_HISTORY_LOAD_TURNS)
+            .execute()
+        )
+        history, base = _tail(msgs)
+        if not history and (blob := _decode_history(res.data)):
+            # Migrated before the route appends, or the blob would be hidden
+            # behind the new rows from then on.
+            migrate_history_blob_sync(user_id, sid, blob)
+            history = blob
+        return _session(res.data, history, base)
 
     @classmethod
     def append(cls, user_id: str, sid: str, role: str, content: str) -> None:
+        session_cache.invalidate(user_id, sid)
+        get_supabase().table("chat_messages").insert(
+            chat_message_rows(user_id, sid, [{"role": role, "content": content}])
+        ).execute()
+
+    @classmethod
+    def exists(cls, user_id: str) -> str | None:
         res = (
-            supabase.table("chat_sessions")
-            .select("history")
+            get_supabase()
+            .table("chat_sessions")
+            .select("session_id")
             .eq("user_id", user_id)
-            .eq("session_id", sid)
             .single()
             .execute()
         )
+        return res.data["session_id"] if res and res.data else None
+
+
+class AsyncSessionStore:
+    """
+    Same contract as SessionStore, backed by the async Supabase client so the
+    chat routes never block the event loop on a database round-trip.
+
+    Reads go through `session_cache`; appends update the cached history and
+    insert the new rows (optionally in the background).
+    """
+
+    # One writer per session at a time so background inserts keep turn order.
+    _write_locks: "weakref.WeakValueDictionary[tuple[str, str], asyncio.Lock]" = (
+        weakref.WeakValueDictionary()
+    )
+
+    @classmethod
+    async def create(cls, user_id: str, logs: dict) -> str:
+        db = await get_async_supabase()
+        sid = str(uuid4())
+        digest = build_logs_digest(logs)
+        session_cache.invalidate(user_id)
+
+        await asyncio.gather(
+            execute(db.table("chat_sessions").delete().eq("user_id", user_id)),
+            execute(db.table("chat_messages").delete().eq("user_id", user_id)),
+        )
+        await execute(
+            db.table("chat_sessions").insert(
+                {
+                    "user_id": user_id,
+                    "session_id": sid,
+                    "logs": json.dumps(logs),
+                    "digest": digest,
+                    "history": json.dumps([]),
+                }
+            )
+        )
+        session_cache.put(
+            user_id,
+            sid,
+            {
+                "logs": logs,
+                "digest": digest,
+                "history": [],
+                "history_base": 0,
+                "context_cache": None,
+                "summary": None,
+                "summarized": 0,
+            },
+        )
+        return sid
+
+    @classmethod
+    async def get(cls, user_id: str, sid: str) -> dict | None:
+        cached = session_cache.get(user_id, sid)
+        if cached is not None:
+            return cached
+
+        db = await get_async_supabase()
+        res, msgs = await asyncio.gather(
+            execute(
+                db.table("chat_sessions")
+                .select("logs,digest,history,context_cache,summary,summarized")
+                .eq("user_id", user_id)
+                .eq("session_id", sid)
+                .single()
+            ),
+            execute(
+                db.table("chat_messages")
+                .select("role,content", count="exact")
+                .eq("session_id", sid)
+                .order("id", desc=True)
+                .limit(settings.CHAT_HISTORY_LOAD_TURNS)
+            ),
+        )
         if not res or not res.data:
-            return
+            return None
 
-        import json
+        history, base = _tail(msgs)
+        if not history and (blob := _decode_history(res.data)):
+            history = blob
+            if not await migrate_history_blob(user_id, sid, blob):
+                # Another request is inserting these same turns; serve the
+                # blob but don't cache it, the next read sees the rows.
+                return _session(res.data, history, 0)
 
-        history = (
-            res.data["history"]
-            if isinstance(res.data["history"], list)
-            else json.loads(res.data["history"])
+        sess = _session(res.data, history, base)
+        session_cache.put(user_id, sid, sess)
+        return sess
+
+    @classmethod
+    async def set_context_cache(cls, user_id: str, sid: str, handle: dict) -> None:
+        db = await get_async_supabase()
+        await execute(
+            db.table("chat_sessions")
+            .update({"context_cache": handle})
+            .eq("user_id", user_id)
+            .eq("session_id", sid)
         )
-        history.append({"role": role, "content": content})
+        cached = session_cache.get(user_id, sid)
+        if cached is not None:
+            session_cache.put(user_id, sid, {**cached, "context_cache": handle})
 
-        supabase.table("chat_sessions").update({"history": json.dumps(history)}).eq(
-            "user_id", user_id
-        ).eq("session_id", sid).execute()
+    @classmethod
+    async def set_summary(
+        cls, user_id: str, sid: str, summary: str, summarized: int
+    ) -> None:
+        """Store the rolling summary covering the first `summarized` turns."""
+        db = await get_async_supabase()
+        await execute(
+            db.table("chat_sessions")
+            .update({"summary": summary, "summarized": summarized})
+            .eq("user_id", user_id)
+            .eq("session_id", sid)
+        )
+        cached = session_cache.get(user_id, sid)
+        if cached is not None:
+            session_cache.put(
+                user_id, sid, {**cached, "summary": summary, "summarized": summarized}
+            )
 
     @classmethod
-    def exists(cls, user_id: str) -> str | None:
-        res = (
-            supabase.table("chat_sessions")
+    async def append(cls, user_id: str, sid: str, role: str, content: str) -> None:
+        await cls.append_many(user_id, sid, [{"role": role, "content": content}])
+
+    @classmethod
+    async def append_many(
+        cls, user_id: str, sid: str, messages: list[dict], background: bool = False
+    ) -> None:
+        """
+        Append several turns with a single insert. With `background=True` the
+        insert is scheduled and the call returns as soon as the cache is updated.
+        """
+        session_cache.extend(user_id, sid, messages)
+        if background:
+            spawn(cls._insert(user_id, sid, messages))
+        else:
+            await cls._insert(user_id, sid, messages)
+
+    @classmethod
+    async def _insert(cls, user_id: str, sid: str, messages: list[dict]) -> None:
+        key = (user_id, sid)
+        lock = cls._write_locks.get(key)
+        if lock is None:
+            lock = cls._write_locks[key] = asyncio.Lock()
+
+        async with lock:
+            db = await get_async_supabase()
+            try:
+                await execute(
+                    db.table("chat_messages").insert(
+                        chat_message_rows(user_id, sid, messages)
+                    )
+                )
+            except Exception as e:
+                logger.warning(
+                    "chat message append failed",
+                    extra={"session_id": sid, "error": repr(e)},
+                )
+                session_cache.invalidate(user_id, sid)
+                raise
+
+    @classmethod
+    async def exists(cls, user_id: str) -> str | None:
+        db = await get_async_supabase()
+        res = await execute(
+            db.table("chat_sessions")
             .select("session_id")
             .eq("user_id", user_id)
             .single()
-            .execute()
         )
         return res.data["session_id"] if res and res.data else None
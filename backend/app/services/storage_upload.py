@@ -0,0 +1,243 @@
+# backend/app/services/storage_upload.py
+"""
+Async uploads to Supabase Storage that stream from the pipeline output.
+
+storage3's `upload()` wants the whole file as bytes (or an open file) and
+sends it as a single request. Here the object is streamed instead:
+
+  * up to `tus_threshold` bytes: one POST to /object/{bucket}/{name} whose
+    body is fed chunk by chunk from the source;
+  * above it: the TUS resumable protocol (/upload/resumable) in fixed-size
+    PATCH chunks. A failed chunk is retried from the offset the server
+    reports, so a dropped connection doesn't restart a large upload.
+
+Sources are read in place: `BytesIO` through `getbuffer()` and bytes through
+memoryview slices (no copy of the MP3), files chunk by chunk from disk.
+
+The storage endpoint is `settings.STORAGE_URL` (defaults to the project's
+/storage/v1), and the client takes an optional httpx transport, so uploads
+can run against a local stand-in.
+"""
+
+import asyncio
+import base64
+from io import BytesIO
+from pathlib import Path
+from typing import AsyncIterator
+
+import httpx
+from app.core.config import settings
+from app.core.metrics import timed
+
+Source = bytes | memoryview | BytesIO | Path
+
+STREAM_PIECE = 256 * 1024  # body piece size for single-request uploads
+
+
+class UploadError(Exception):
+    pass
+
+
+def _b64(value: str) -> str:
+    return base64.b64encode(value.encode()).decode()
+
+
+def source_size(src: Source) -> int:
+    if isinstance(src, Path):
+        return src.stat().st_size
+    if isinstance(src, BytesIO):
+        return src.getbuffer().nbytes
+    return len(src)
+
+
+async def _read(src: Source, start: int, end: int) -> AsyncIterator[bytes]:
+    """Yield src[start:end] in STREAM_PIECE pieces without copying in-memory sources."""
+    if isinstance(src, Path):
+        with open(src, "rb") as f:
+            f.seek(start)
+            pos = start
+            while pos < end:
+                piece = await asyncio.to_thread(f.read, min(STREAM_PIECE, end - pos))
+                if not piece:
+                    raise UploadError(f"{src} shrank while uploading")
+                pos += len(piece)
+                yield piece
+        return
+
+    view = src.getbuffer() if isinstance(src, BytesIO) else memoryview(src)
+    try:
+        for pos in range(start, end, STREAM_PIECE):
+            yield view[pos : min(pos + STREAM_PIECE, end)]
+    finally:
+        view.release()
+
+
+class StorageUploader:
+    def __init__(
+        self,
+        base_url: str,
+        key: str,
+        tus_threshold: int,
+        chunk_size: int,
+        retries: int,
+        timeout: float,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.key = key
+        self.tus_threshold = tus_threshold
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = timeout
+        self.transport = transport
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.key}", "apikey": self.key},
+                timeout=self.timeout,
+                transport=self.transport,
+            )
+        return self._client
+
+    def public_url(self, bucket: str, name: str) -> str:
+        """Same URL as storage's get_public_url, without a round-trip."""
+        return f"{self.base_url}/object/public/{bucket}/{name}"
+
+    async def upload(
+        self,
+        bucket: str,
+        name: str,
+        src: Source,
+        content_type: str = "audio/mpeg",
+        tail: asyncio.Event | None = None,
+        upsert: bool = False,
+    ) -> str:
+        """
+        Upload `src` to bucket/name and return its public URL. `tail` is set
+        when the last chunk starts going out, so callers can overlap follow-up
+        work (the DB insert) with the end of the transfer. With `upsert`, an
+        existing object of that name is replaced instead of failing.
+        """
+        size = source_size(src)
+        args = (bucket, name, src, size, content_type, tail, upsert)
+        if size > self.tus_threshold:
+            with timed("upload", "tus"):
+                await self._upload_tus(*args)
+        else:
+            with timed("upload", "single"):
+                await self._upload_single(*args)
+        return self.public_url(bucket, name)
+
+    async def _upload_single(
+        self,
+        bucket: str,
+        name: str,
+        src: Source,
+        size: int,
+        content_type: str,
+        tail: asyncio.Event | None,
+        upsert: bool,
+    ) -> None:
+        if tail is not None:
+            tail.set()  # a single request is all tail
+        resp = await self.client.post(
+            f"{self.base_url}/object/{bucket}/{name}",
+            content=_read(src, 0, size),
+            headers={
+                "Content-Type": content_type,
+                "Content-Length": str(size),
+                "x-upsert": "true" if upsert else "false",
+            },
+        )
+        if resp.status_code >= 300:
+            raise UploadError(
+                f"upload of {name} failed: {resp.status_code} {resp.text}"
+            )
+
+    async def _upload_tus(
+        self,
+        bucket: str,
+        name: str,
+        src: Source,
+        size: int,
+        content_type: str,
+        tail: asyncio.Event | None,
+        upsert: bool,
+    ) -> None:
+        tus = {"Tus-Resumable": "1.0.0"}
+        resp = await self.client.post(
+            f"{self.base_url}/upload/resumable",
+            headers={
+                **tus,
+                "Upload-Length": str(size),
+                "Upload-Metadata": ",".join(
+                    f"{k} {_b64(v)}"
+                    for k, v in {
+                        "bucketName": bucket,
+                        "objectName": name,
+                        "contentType": content_type,
+                        "cacheControl": "3600",
+                    }.items()
+                ),
+                "x-upsert": "true" if upsert else "false",
+            },
+        )
+        if resp.status_code != 201:
+            raise UploadError(f"could not start upload of {name}: {resp.status_code}")
+        location = httpx.URL(self.base_url).join(resp.headers["Location"])
+
+        offset, failures = 0, 0
+        while offset < size:
+            end = min(offset + self.chunk_size, size)
+            if tail is not None and end == size:
+                tail.set()
+            try:
+                resp = await self.client.patch(
+                    location,
+                    content=_read(src, offset, end),
+                    headers={
+                        **tus,
+                        "Upload-Offset": str(offset),
+                        "Content-Type": "application/offset+octet-stream",
+                        "Content-Length": str(end - offset),
+                    },
+                )
+                if resp.status_code != 204:
+                    raise UploadError(f"chunk at {offset} rejected: {resp.status_code}")
+                offset = int(resp.headers["Upload-Offset"])
+                failures = 0
+            except (httpx.TransportError, UploadError) as e:
+                failures += 1
+                if failures > self.retries:
+                    raise UploadError(f"upload of {name} failed at {offset}: {e}")
+                await asyncio.sleep(0.5 * 2 ** (failures - 1))
+                # Resume from wherever the server got to.
+                head = await self.client.head(location, headers=tus)
+                if head.status_code >= 300:
+                    raise UploadError(f"upload of {name} lost: {head.status_code}")
+                offset = int(head.headers["Upload-Offset"])
+
+    async def delete(self, bucket: str, name: str) -> None:
+        resp = await self.client.delete(f"{self.base_url}/object/{bucket}/{name}")
+        if resp.status_code >= 300 and resp.status_code != 404:
+            raise UploadError(
+                f"delete of {name} failed: {resp.status_code} {resp.text}"
+            )
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+storage_uploader = StorageUploader(
+    settings.STORAGE_URL or f"{settings.SUPABASE_URL}/storage/v1",
+    settings.SUPABASE_SERVICE_KEY,
+    tus_threshold=settings.STORAGE_TUS_THRESHOLD,
+    chunk_size=settings.STORAGE_CHUNK_BYTES,
+    retries=settings.STORAGE_UPLOAD_RETRIES,
+    timeout=settings.STORAGE_TIMEOUT,
+)
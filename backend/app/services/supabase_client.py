@@ -1,14 +1,159 @@
+"""
+Supabase clients.
+
+The app talks to PostgREST through one application-scoped async client,
+opened in the FastAPI lifespan (`start_supabase` / `stop_supabase`) on a
+single httpx connection pool that is sized, timed out and kept alive per the
+SUPABASE_* settings. `execute()` runs a query with a deadline and retries
+reads on transient transport errors.
+
+Every request the pool sends is traced, so `db_stats()` can report how many
+new TCP connections were opened per 1000 requests (near 0 when keep-alive
+works; ~1000 when every request dials a fresh connection).
+
+The blocking client (`get_supabase()`) is only kept for the sync baseline
+route /chat/message/sync.
+"""
+
+import asyncio
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 
+import httpx
 from app.core.config import settings
+from app.core.metrics import timed
+from postgrest.types import RequestMethod
+
+from supabase import (
+    AsyncClient,
+    AsyncClientOptions,
+    Client,
+    acreate_client,
+    create_client,
+)
+
+_async_supabase: AsyncClient | None = None
+_http: httpx.AsyncClient | None = None
+
+# request / connection counters for db_stats()
+_stats = {"requests": 0, "connections": 0, "retries": 0, "timeouts": 0}
+
+
+async def _trace(event: str, info: dict) -> None:
+    # httpcore trace hook: fires once per TCP connect, not per request.
+    if event == "connection.connect_tcp.complete":
+        _stats["connections"] += 1
+
+
+async def _on_request(request: httpx.Request) -> None:
+    _stats["requests"] += 1
+    request.extensions["trace"] = _trace
+
+
+def _http_client(
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.SUPABASE_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.SUPABASE_MAX_KEEPALIVE,
+        keepalive_expiry=settings.SUPABASE_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=httpx.Timeout(
+            settings.SUPABASE_TIMEOUT, connect=settings.SUPABASE_CONNECT_TIMEOUT
+        ),
+        # HTTP/2 needs the optional `h2` package (pip install "httpx[http2]").
+        http2=settings.SUPABASE_HTTP2,
+        transport=transport
+        or httpx.AsyncHTTPTransport(
+            limits=limits, http2=settings.SUPABASE_HTTP2, retries=1
+        ),
+        event_hooks={"request": [_on_request]},
+    )
+
+
+async def start_supabase(transport: httpx.AsyncBaseTransport | None = None) -> None:
+    """Open the shared async client (FastAPI lifespan startup)."""
+    global _async_supabase, _http
+    if _async_supabase is not None:
+        return
+    _http = _http_client(transport)
+    _async_supabase = await acreate_client(
+        settings.SUPABASE_URL,
+        settings.SUPABASE_SERVICE_KEY,
+        options=AsyncClientOptions(httpx_client=_http),
+    )
 
-from supabase import create_client
 
-supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+async def stop_supabase() -> None:
+    """Close the pool (FastAPI lifespan shutdown)."""
+    global _async_supabase, _http
+    if _http is not None:
+        await _http.aclose()
+    _async_supabase = _http = None
 
 
-def get_last_two_weeks_logs(user_id: str):
+async def get_async_supabase() -> AsyncClient:
+    """
+    Returns the shared async Supabase client. Opened by the lifespan; scripts
+    and tests that run without it get it opened on first use.
+    """
+    if _async_supabase is None:
+        await start_supabase()
+    return _async_supabase
+
+
+async def execute(query, timeout: float | None = None, retries: int | None = None):
+    """
+    Execute a PostgREST query builder with a deadline (default
+    SUPABASE_TIMEOUT). Reads (GET/HEAD) are retried up to SUPABASE_RETRIES
+    times on timeouts and transport errors; writes are never retried.
+    """
+    timeout = settings.SUPABASE_TIMEOUT if timeout is None else timeout
+    if retries is None:
+        idempotent = query.request.http_method in (
+            RequestMethod.GET,
+            RequestMethod.HEAD,
+        )
+        retries = settings.SUPABASE_RETRIES if idempotent else 0
+
+    table = str(query.request.path).rsplit("/", 1)[-1]
+    with timed("db", f"{query.request.http_method.value} {table}"):
+        for attempt in range(retries + 1):
+            try:
+                return await asyncio.wait_for(query.execute(), timeout)
+            except (asyncio.TimeoutError, httpx.TransportError) as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    _stats["timeouts"] += 1
+                if attempt == retries:
+                    raise
+                _stats["retries"] += 1
+                await asyncio.sleep(settings.SUPABASE_RETRY_BACKOFF * 2**attempt)
+
+
+def db_stats() -> dict:
+    requests = _stats["requests"]
+    pool = getattr(getattr(_http, "_transport", None), "_pool", None)
+    return {
+        **_stats,
+        "new_connections_per_1k_requests": (
+            round(_stats["connections"] * 1000 / requests, 2) if requests else None
+        ),
+        "open_connections": len(pool.connections) if pool is not None else 0,
+        "max_connections": settings.SUPABASE_MAX_CONNECTIONS,
+        "http2": settings.SUPABASE_HTTP2,
+    }
+
+
+@lru_cache
+def get_supabase() -> Client:
+    """Blocking client, for the sync baseline route only."""
+    return create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+
+
+async def get_last_two_weeks_logs(user_id: str):
     """
     Fetches the last two weeks of logs for the given user_id.
     Returns a dict with keys 'study', 'sleep', and 'mood'.
@@ -42,39 +187,13 @@ def get_last_two_weeks_logs(user_id: str):
         "mood":  [ { ...mood_logs row... }, ... ]
     }
     """
-    since = (datetime.utcnow() - timedelta(days=14)).isoformat()
-    study = (
-        supabase.table("study_sessions")
-        .select("*")
-        .eq("user_id", user_id)
-        .gte("started_at", since)
-        .order("started_at", desc=True)
-        .execute()
-    )
-    sleep = (
-        supabase.table("sleep_logs")
-        .select("*")
-        .eq("user_id", user_id)
-        .gte("date", since[:10])
-        .order("date", desc=True)
-        .execute()
-    )
-    mood = (
-        supabase.table("mood_logs")
-        .select("*")
-        .eq("user_id", user_id)
-        .gte("at", since)
-        .order("at", desc=True)
-        .execute()
-    )
-    return {
-        "study": study.data if hasattr(study, "data") else [],
-        "sleep": sleep.data if hasattr(sleep, "data") else [],
-        "mood": mood.data if hasattr(mood, "data") else [],
-    }
+    # Same concurrent, cached path as the chat session start.
+    from app.services.supabase_logs import afetch_logs
+
+    return await afetch_logs(user_id, days=14)
 
 
-def get_all_todos(user_id: str):
+async def get_all_todos(user_id: str):
     """
     Fetches all todos for the given user_id.
     Returns a list of dicts, each dict representing a row with all columns from the todos table.
@@ -90,17 +209,14 @@ def get_all_todos(user_id: str):
     Example return:
     [ { ...todos row... }, ... ]
     """
-    res = (
-        supabase.table("todos")
-        .select("*")
-        .eq("user_id", user_id)
-        .order("priority")
-        .execute()
+    db = await get_async_supabase()
+    res = await execute(
+        db.table("todos").select("*").eq("user_id", user_id).order("priority")
     )
     return res.data if hasattr(res, "data") else []
 
 
-def get_long_term_goals(user_id: str):
+async def get_long_term_goals(user_id: str):
     """
     Fetches all long-term goals for the given user_id.
     Returns a list of dicts, each dict representing a row with all columns from the long_term_goals table.
@@ -114,17 +230,17 @@ def get_long_term_goals(user_id: str):
     Example return:
     [ { ...long_term_goals row... }, ... ]
     """
-    res = (
-        supabase.table("long_term_goals")
+    db = await get_async_supabase()
+    res = await execute(
+        db.table("long_term_goals")
         .select("*")
         .eq("user_id", user_id)
         .order("created_at")
-        .execute()
     )
     return res.data if hasattr(res, "data") else []
 
 
-def get_short_term_goals(user_id: str):
+async def get_short_term_goals(user_id: str):
     """
     Fetches all short-term goals for the given user_id.
     Returns a list of dicts, each dict representing a row with all columns from the short_term_goals table.
@@ -138,57 +254,166 @@ def get_short_term_goals(user_id: str):
     Example return:
     [ { ...short_term_goals row... }, ... ]
     """
-    res = (
-        supabase.table("short_term_goals")
+    db = await get_async_supabase()
+    res = await execute(
+        db.table("short_term_goals")
         .select("*")
         .eq("user_id", user_id)
         .order("created_at")
-        .execute()
     )
     return res.data if hasattr(res, "data") else []
 
 
-def get_chat_session(user_id: str, session_id: str):
-    res = (
-        supabase.table("chat_sessions")
+async def get_chat_session(user_id: str, session_id: str):
+    db = await get_async_supabase()
+    res = await execute(
+        db.table("chat_sessions")
         .select("logs,history")
         .eq("user_id", user_id)
         .eq("session_id", session_id)
         .single()
-        .execute()
     )
     if not hasattr(res, "data") or not res.data:
         return None
     row = res.data
+    msgs = await execute(
+        db.table("chat_messages")
+        .select("role,content")
+        .eq("session_id", session_id)
+        .order("id")
+    )
+    history = msgs.data
+    blob = row["history"] or []
+    blob = blob if isinstance(blob, list) else json.loads(blob)
+    if not history and blob:
+        # Legacy session: move the blob into rows before anyone appends.
+        await migrate_history_blob(user_id, session_id, blob)
+        history = blob
     return {
         "logs": (
             row["logs"] if isinstance(row["logs"], dict) else json.loads(row["logs"])
         ),
-        "history": (
-            row["history"]
-            if isinstance(row["history"], list)
-            else json.loads(row["history"])
-        ),
+        "history": history,
     }
 
 
-def create_chat_session(user_id: str, session_id: str, logs: dict):
-    supabase.table("chat_sessions").delete().eq("user_id", user_id).execute()
-    supabase.table("chat_sessions").insert(
+async def create_chat_session(user_id: str, session_id: str, logs: dict):
+    await delete_chat_session(user_id)
+    db = await get_async_supabase()
+    await execute(
+        db.table("chat_sessions").insert(
+            {
+                "user_id": user_id,
+                "session_id": session_id,
+                "logs": json.dumps(logs),
+                "history": json.dumps([]),
+            }
+        )
+    )
+
+
+async def append_chat_messages(user_id: str, session_id: str, messages: list):
+    """
+    Appends turns ({"role", "content"} dicts) to a session as chat_messages rows.
+    One insert regardless of how long the conversation already is.
+    """
+    db = await get_async_supabase()
+    await execute(
+        db.table("chat_messages").insert(
+            chat_message_rows(user_id, session_id, messages)
+        )
+    )
+
+
+def chat_message_rows(user_id: str, session_id: str, messages: list) -> list[dict]:
+    return [
         {
             "user_id": user_id,
             "session_id": session_id,
-            "logs": json.dumps(logs),
-            "history": json.dumps([]),
+            "role": m["role"],
+            "content": m["content"],
         }
-    ).execute()
+        for m in messages
+    ]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
 
 
-def update_chat_history(user_id: str, session_id: str, history: list):
-    supabase.table("chat_sessions").update({"history": json.dumps(history)}).eq(
-        "user_id", user_id
-    ).eq("session_id", session_id).execute()
+def _claim_blob(db, user_id: str, session_id: str):
+    # Matches while the blob is still set and nobody holds a live claim.
+    lapsed = (_now() - timedelta(seconds=settings.CHAT_MIGRATION_LEASE)).isoformat()
+    return (
+        db.table("chat_sessions")
+        .update({"history_migrating_at": _now().isoformat()})
+        .eq("user_id", user_id)
+        .eq("session_id", session_id)
+        .neq("history", "[]")
+        .or_(f"history_migrating_at.is.null,history_migrating_at.lt.{lapsed}")
+    )
+
 
+def _finish_blob(db, user_id: str, session_id: str, migrated: bool):
+    changes = {"history_migrating_at": None}
+    if migrated:
+        changes["history"] = []
+    return (
+        db.table("chat_sessions")
+        .update(changes)
+        .eq("user_id", user_id)
+        .eq("session_id", session_id)
+    )
 
-def delete_chat_session(user_id: str):
-    supabase.table("chat_sessions").delete().eq("user_id", user_id).execute()
+
+async def migrate_history_blob(user_id: str, session_id: str, history: list) -> bool:
+    """
+    Move a legacy chat_sessions.history blob into chat_messages rows.
+
+    The migration is claimed with a conditional update of
+    `history_migrating_at`, so of two concurrent reads (any process) only one
+    inserts; a claim older than CHAT_MIGRATION_LEASE counts as abandoned.
+    The blob is cleared only after its rows exist, so a read in between sees
+    either the blob or the rows, never an empty session. Returns False if
+    another request holds the claim.
+    """
+    db = await get_async_supabase()
+    claimed = await execute(_claim_blob(db, user_id, session_id))
+    if not claimed.data:
+        return False
+    try:
+        await execute(
+            db.table("chat_messages").insert(
+                chat_message_rows(user_id, session_id, history)
+            )
+        )
+    except Exception:
+        await execute(_finish_blob(db, user_id, session_id, migrated=False))
+        raise
+    await execute(_finish_blob(db, user_id, session_id, migrated=True))
+    return True
+
+
+def migrate_history_blob_sync(user_id: str, session_id: str, history: list) -> bool:
+    """Blocking variant of migrate_history_blob, for the sync chat route."""
+    db = get_supabase()
+    claimed = _claim_blob(db, user_id, session_id).execute()
+    if not claimed.data:
+        return False
+    try:
+        db.table("chat_messages").insert(
+            chat_message_rows(user_id, session_id, history)
+        ).execute()
+    except Exception:
+        _finish_blob(db, user_id, session_id, migrated=False).execute()
+        raise
+    _finish_blob(db, user_id, session_id, migrated=True).execute()
+    return True
+
+
+async def delete_chat_session(user_id: str):
+    db = await get_async_supabase()
+    await asyncio.gather(
+        execute(db.table("chat_sessions").delete().eq("user_id", user_id)),
+        execute(db.table("chat_messages").delete().eq("user_id", user_id)),
+    )
@@ -1,42 +1,94 @@
+import asyncio
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Dict
 
 from app.core.config import settings
-from supabase import Client, create_client
+from app.services.supabase_client import execute, get_async_supabase
 
-supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
 
+class LogsCache:
+    """
+    (user_id, days) -> logs, LRU + TTL. Short-lived: it only has to cover a
+    burst of session starts / meditation prompts, and writes invalidate it.
+    Bounded, so memory doesn't grow with the number of distinct users.
+    """
 
-def fetch_logs(user_id: str) -> Dict:
-    """Return study/sleep/mood logs for the last 15 days."""
-    since = (datetime.utcnow() - timedelta(days=15)).isoformat()
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[tuple[str, int], tuple[float, Dict]] = OrderedDict()
 
-    study = (
-        supabase.table("study_sessions")
+    def get(self, user_id: str, days: int) -> Dict | None:
+        key = (user_id, days)
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def put(self, user_id: str, days: int, logs: Dict) -> Dict:
+        key = (user_id, days)
+        self._data[key] = (time.monotonic() + self.ttl, logs)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return logs
+
+    def invalidate(self, user_id: str) -> None:
+        for key in [k for k in self._data if k[0] == user_id]:
+            del self._data[key]
+
+
+logs_cache = LogsCache(settings.LOGS_CACHE_MAXSIZE, settings.LOGS_CACHE_TTL)
+
+
+def invalidate_logs(user_id: str) -> None:
+    """Forget cached logs for a user (call after they write a new log)."""
+    logs_cache.invalidate(user_id)
+
+
+def _queries(db, user_id: str, days: int) -> tuple:
+    """The three unexecuted study/sleep/mood queries, newest rows first."""
+    since = (datetime.utcnow() - timedelta(days=days)).isoformat()
+    return (
+        db.table("study_sessions")
         .select("*")
         .eq("user_id", user_id)
         .gte("started_at", since)
-        .order("started_at", desc=True)
-        .execute()
-        .data
-    )
-    sleep = (
-        supabase.table("sleep_logs")
+        .order("started_at", desc=True),
+        db.table("sleep_logs")
         .select("*")
         .eq("user_id", user_id)
         .gte("date", since[:10])
-        .order("date", desc=True)
-        .execute()
-        .data
-    )
-    mood = (
-        supabase.table("mood_logs")
+        .order("date", desc=True),
+        db.table("mood_logs")
         .select("*")
         .eq("user_id", user_id)
         .gte("at", since)
-        .order("at", desc=True)
-        .execute()
-        .data
+        .order("at", desc=True),
     )
 
-    return {"study": study or [], "sleep": sleep or [], "mood": mood or []}
+
+async def afetch_logs(user_id: str, days: int = 15) -> Dict:
+    """
+    Study/sleep/mood logs for the last `days` days; the three queries run
+    concurrently on the async client.
+    """
+    logs = logs_cache.get(user_id, days)
+    if logs is not None:
+        return logs
+
+    db = await get_async_supabase()
+    study, sleep, mood = await asyncio.gather(
+        *(execute(q) for q in _queries(db, user_id, days))
+    )
+    return logs_cache.put(
+        user_id,
+        days,
+        {"study": study.data or [], "sleep": sleep.data or [], "mood": mood.data or []},
+    )
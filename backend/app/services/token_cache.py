@@ -0,0 +1,74 @@
+# backend/app/services/token_cache.py
+import hashlib
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+
+
+class TokenCache:
+    """
+    Bounded LRU map from an access token's digest to its verified `sub`.
+
+    An entry lives for `ttl` seconds, and never past the token's own `exp`,
+    so a cached token is never accepted for longer than jwt.decode would
+    accept it. There is no explicit revocation: the short ttl bounds how long
+    a worker keeps trusting a verification made before a secret rotation.
+    Raw tokens are not kept, only a 128-bit digest.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[bytes, tuple[float, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, token: str) -> str | None:
+        """The verified `sub`, or None if the token has to be decoded."""
+        key = self.digest(token)
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        exp, sub = entry
+        if exp <= time.time():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return sub
+
+    def put(self, token: str, sub: str, exp: float) -> None:
+        key = self.digest(token)
+        self._data[key] = (min(exp, time.time() + self.ttl), sub)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+token_cache = TokenCache(settings.AUTH_CACHE_MAXSIZE, settings.AUTH_CACHE_TTL)
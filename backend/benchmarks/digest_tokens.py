@@ -0,0 +1,109 @@
+# backend/benchmarks/digest_tokens.py
+"""
+Prompt size of the old raw-row log dump vs. build_logs_digest.
+
+    cd backend && python -m benchmarks.digest_tokens
+
+Uses tiktoken (o200k_base, gpt-4o family) when it is installed and can load
+its encoding; otherwise falls back to the ~4 chars/token rule of thumb.
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from app.services.agents.base import format_context
+from app.services.log_digest import build_logs_digest
+
+NOTES = [
+    "Felt distracted by my phone",
+    "Great deep-work block, finished the assignment",
+    "Slept late, groggy all morning",
+    "Anxious about the exam on Friday",
+    "",
+    "",
+]
+
+
+def legacy_format(study, sleep, mood, user_msg: str) -> str:
+    """The pre-digest prompt: Python repr of every raw row."""
+    return (
+        "The user’s wellbeing data for the last 2 weeks is below.\n\n"
+        f"Study sessions ({len(study)}): {study}\n\n"
+        f"Sleep logs ({len(sleep)}): {sleep}\n\n"
+        f"Mood logs ({len(mood)}): {mood}\n\n"
+        f"User question: {user_msg}\n\n"
+        "Answer helpfully and concisely, referring to the data when useful. Return the answer in plain text. Limit to about five sentences."
+    )
+
+
+def synthetic_logs(per_day: int, days: int = 15, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    uid = str(uuid4())
+    now = datetime.now(timezone.utc)
+    study, sleep, mood = [], [], []
+    for d in range(days):
+        day = now - timedelta(days=d)
+        sleep.append(
+            {
+                "id": str(uuid4()),
+                "user_id": uid,
+                "date": day.date().isoformat(),
+                "score": rng.randint(1, 5),
+                "note": rng.choice(NOTES),
+            }
+        )
+        for _ in range(per_day):
+            start = day.replace(hour=rng.randint(8, 20), minute=rng.randint(0, 59))
+            study.append(
+                {
+                    "id": str(uuid4()),
+                    "user_id": uid,
+                    "started_at": start.isoformat(),
+                    "ended_at": (
+                        start + timedelta(minutes=rng.randint(25, 120))
+                    ).isoformat(),
+                    "total_break_secs": rng.randint(0, 900),
+                    "productivity": rng.randint(1, 5),
+                    "note": rng.choice(NOTES),
+                }
+            )
+            mood.append(
+                {
+                    "id": str(uuid4()),
+                    "user_id": uid,
+                    "at": (start + timedelta(hours=1)).isoformat(),
+                    "score": rng.randint(1, 5),
+                    "note": rng.choice(NOTES),
+                }
+            )
+    return {"study": study, "sleep": sleep, "mood": mood}
+
+
+def token_counter():
+    try:
+        import tiktoken
+
+        enc = tiktoken.get_encoding("o200k_base")
+        return "tiktoken o200k_base", lambda s: len(enc.encode(s))
+    except Exception:
+        return "chars/4 estimate", lambda s: len(s) // 4
+
+
+def main() -> None:
+    label, count = token_counter()
+    question = "How has my sleep been?"
+    print(f"token counter: {label}")
+    print(
+        f"{'entries/day':>12} {'rows':>6} {'raw tokens':>11} {'digest':>8} {'saved':>7}"
+    )
+    for per_day in (0, 1, 3, 6, 10):
+        logs = synthetic_logs(per_day)
+        rows = sum(len(v) for v in logs.values())
+        raw = count(legacy_format(logs["study"], logs["sleep"], logs["mood"], question))
+        digest = count(format_context(build_logs_digest(logs)) + question)
+        print(f"{per_day:>12} {rows:>6} {raw:>11} {digest:>8} {1 - digest / raw:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+# backend/benchmarks/load_bench.py
+"""
+Offline load test of the real app (app.main:app under uvicorn) against the
+local stand-ins in benchmarks/stubs.py (PostgREST, Storage, OpenAI, Gemini).
+
+    cd backend && python -m benchmarks.load_bench [--concurrency 8]
+        [--requests 200] [--renders 32] [--scenarios session,message,list]
+        [--save-baseline] [--tolerance 0.25]
+
+Scenarios: POST /chat/session, POST /chat/message, POST /meditate/ and
+GET /meditate/list, each driven by `--concurrency` workers (one bench user
+per worker) until its request count is done. Reports throughput, p50/p95/p99
+latency, errors and the app's peak RSS (main process and, separately, its
+mix workers).
+
+Results are compared with the stored baseline (benchmarks/load_baseline.json)
+when it was recorded with the same settings: lower throughput, higher p95 or
+higher peak RSS than baseline by more than `--tolerance`, or any failed
+request, exits non-zero. `--save-baseline` records the current run instead;
+baselines are machine-specific, so record one per machine/CI runner.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from statistics import quantiles
+
+import httpx
+from benchmarks.stubs import StubConfig, bench_user
+from jose import jwt
+
+BACKEND = Path(__file__).resolve().parent.parent
+BASELINE = Path(__file__).with_name("load_baseline.json")
+JWT_SECRET = "load-bench-secret"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def token(user_id: str) -> str:
+    now = int(time.time())
+    claims = {"sub": user_id, "aud": "authenticated", "iat": now, "exp": now + 3600}
+    return jwt.encode(claims, JWT_SECRET, algorithm="HS256")
+
+
+# -------- Scenarios --------
+# Each takes (client, user_id, n, state) and returns the response of one
+# request; `state` is per worker (e.g. the session /chat/message posts to).
+
+
+async def chat_session(client: httpx.AsyncClient, user: str, n: int, state: dict):
+    return await client.post("/chat/session", json={"user_id": user})
+
+
+async def chat_message(client: httpx.AsyncClient, user: str, n: int, state: dict):
+    return await client.post(
+        "/chat/message",
+        json={
+            "user_id": user,
+            "session_id": state["session_id"],
+            "message": f"How has my sleep been? ({n})",  # unique: no reply-cache hits
+        },
+    )
+
+
+async def meditate(client: httpx.AsyncClient, user: str, n: int, state: dict):
+    return await client.post(
+        "/meditate/",
+        data={"prompt": f"calm before exam {n}", "background": "rain", "user_id": user},
+    )
+
+
+async def meditate_list(client: httpx.AsyncClient, user: str, n: int, state: dict):
+    return await client.get("/meditate/list")
+
+
+SCENARIOS = {
+    "session": chat_session,
+    "message": chat_message,
+    "meditate": meditate,
+    "list": meditate_list,
+}
+
+
+async def run_scenario(
+    base_url: str, name: str, concurrency: int, requests: int
+) -> dict:
+    counter = iter(range(requests))
+    latencies: list[float] = []
+    errors: list[str] = []
+
+    async def worker(w: int) -> None:
+        user = bench_user(w)
+        async with httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {token(user)}"},
+            timeout=120,
+        ) as client:
+            state: dict = {}
+            if name == "message":  # untimed setup: one session per worker
+                resp = await chat_session(client, user, 0, state)
+                state["session_id"] = resp.json()["session_id"]
+            for n in counter:
+                t0 = time.perf_counter()
+                try:
+                    resp = await SCENARIOS[name](client, user, n, state)
+                except httpx.HTTPError as e:
+                    errors.append(repr(e))
+                    continue
+                if resp.status_code >= 400:
+                    errors.append(f"{resp.status_code} {resp.text[:120]}")
+                    continue
+                latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    wall = time.perf_counter() - t0
+
+    cuts = quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else []
+    pct = (lambda q: cuts[q - 1] * 1000) if cuts else (lambda q: float("nan"))
+    return {
+        "requests": requests,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "rps": round(len(latencies) / wall, 2),
+        "p50_ms": round(pct(50), 2),
+        "p95_ms": round(pct(95), 2),
+        "p99_ms": round(pct(99), 2),
+    }
+
+
+# -------- Processes --------
+
+
+def start(args: list[str], log: Path, env: dict | None = None) -> subprocess.Popen:
+    with open(log, "wb") as out:  # the child keeps its own handle
+        return subprocess.Popen(
+            [sys.executable, *args],
+            cwd=BACKEND,
+            env=env,
+            stdout=out,
+            stderr=subprocess.STDOUT,
+        )
+
+
+def wait_ready(
+    url: str, proc: subprocess.Popen, log: Path, timeout: float = 60
+) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"{url} exited with {proc.returncode}, see {log}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise SystemExit(f"{url} did not come up in {timeout:.0f}s")
+
+
+def peak_rss_mb(pid: int) -> tuple[float | None, float | None]:
+    """VmHWM of the process and the largest of its children (Linux /proc)."""
+
+    def hwm(p: int) -> float | None:
+        try:
+            for line in Path(f"/proc/{p}/status").read_text().splitlines():
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            return None
+        return None
+
+    try:
+        children = Path(f"/proc/{pid}/task/{pid}/children").read_text().split()
+    except OSError:
+        children = []
+    child_peaks = [m for c in children if (m := hwm(int(c))) is not None]
+    return hwm(pid), max(child_peaks, default=None)
+
+
+# -------- Baseline --------
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    problems = []
+    for name, now in result["scenarios"].items():
+        if now["errors"]:
+            problems.append(f"{name}: {now['errors']} failed ({now['first_error']})")
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        if now["rps"] < base["rps"] * (1 - tolerance):
+            problems.append(f"{name}: {now['rps']:.1f} rps vs {base['rps']:.1f}")
+        if now["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(
+                f"{name}: p95 {now['p95_ms']:.1f} vs {base['p95_ms']:.1f} ms"
+            )
+    for key in ("app_rss_mb", "worker_rss_mb"):
+        now, base = result.get(key), baseline.get(key)
+        if now and base and now > base * (1 + tolerance):
+            problems.append(f"{key}: {now:.0f} vs {base:.0f} MB")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--renders", type=int, default=32, help="meditate requests")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    defaults = StubConfig(users=0)
+    for field, value in vars(defaults).items():
+        if field != "users":
+            parser.add_argument(
+                f"--{field.replace('_', '-')}", type=type(value), default=value
+            )
+    args = parser.parse_args()
+    scenarios = [s for s in args.scenarios.split(",") if s]
+
+    stub_args = [
+        f"--{f.replace('_', '-')}={getattr(args, f)}"
+        for f in vars(defaults)
+        if f != "users"
+    ]
+    config = {
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "renders": args.renders,
+        "stubs": stub_args,
+    }
+
+    stub_port, app_port = free_port(), free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+    workdir = Path(tempfile.mkdtemp(prefix="load-bench-"))
+    stub_log, app_log = workdir / "stubs.log", workdir / "app.log"
+    env = {
+        **os.environ,
+        "SUPABASE_URL": stub_url,
+        "SUPABASE_SERVICE_KEY": "bench",
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "GEMINI_API_KEY": "bench",
+        "GOOGLE_GEMINI_BASE_URL": stub_url,
+        "MEDITATION_JOBS_DB": str(workdir / "jobs.sqlite3"),
+        # Fresh cache every run, so /meditate/ renders instead of hitting it.
+        "AUDIO_DIR": str(workdir / "audio"),
+    }
+
+    stubs = start(
+        [
+            "-m",
+            "benchmarks.stubs",
+            f"--port={stub_port}",
+            f"--users={max(args.concurrency, 1)}",
+            *stub_args,
+        ],
+        stub_log,
+    )
+    app = None
+    try:
+        wait_ready(f"{stub_url}/rest/v1/health", stubs, stub_log)
+        app = start(
+            [
+                "-m",
+                "uvicorn",
+                "app.main:app",
+                f"--port={app_port}",
+                "--log-level=warning",
+            ],
+            app_log,
+            env,
+        )
+        wait_ready(f"{app_url}/metrics", app, app_log)
+
+        result = {"config": config, "scenarios": {}}
+        for name in scenarios:
+            count = args.renders if name == "meditate" else args.requests
+            result["scenarios"][name] = asyncio.run(
+                run_scenario(app_url, name, args.concurrency, count)
+            )
+        result["app_rss_mb"], result["worker_rss_mb"] = peak_rss_mb(app.pid)
+    finally:
+        for proc in (app, stubs):
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+    print(
+        f"{'scenario':<10} {'reqs':>5} {'errors':>6} {'req/s':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for name, r in result["scenarios"].items():
+        print(
+            f"{name:<10} {r['requests']:>5} {r['errors']:>6} {r['rps']:>8.1f} "
+            f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}"
+        )
+    rss = lambda v: f"{v:.0f} MB" if v is not None else "n/a"  # noqa: E731
+    print(
+        f"peak RSS: app {rss(result['app_rss_mb'])}, "
+        f"largest mix worker {rss(result['worker_rss_mb'])}; logs in {workdir}"
+    )
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"baseline saved to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print("no baseline stored; run with --save-baseline to record one")
+        return
+    baseline = json.loads(args.baseline.read_text())
+    if baseline["config"] != config:
+        print("baseline was recorded with different settings; not compared")
+        return
+    problems = compare(result, baseline, args.tolerance)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    if problems:
+        sys.exit(1)
+    print(f"within {args.tolerance:.0%} of baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# backend/benchmarks/mix_bench.py
+"""
+Mixing step: pydub overlay (the previous implementation) vs the NumPy engine.
+
+    cd backend && python -m benchmarks.mix_bench [--encode]
+
+Both sides start from the same decoded speech and the same pre-attenuated
+background PCM, so only the tiling/overlay work is compared. `--encode`
+also times the MP3 export (ffmpeg), which is identical for both.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+from app.services.audio_mix import encode_mp3, mix_pcm
+from app.services.bg_cache import SAMPLE_RATE, bg_samples
+from pydub import AudioSegment
+
+BG_PATH = Path("static/audios/rain.mp3")
+CACHE_DIR = Path(".bg_cache")
+MINUTES = (1, 2, 5, 10)
+
+
+def pydub_mix(speech: AudioSegment, bg: AudioSegment) -> AudioSegment:
+    """The pre-NumPy mix_with_bg body, minus decoding."""
+    if len(bg) < len(speech):
+        bg *= len(speech) // len(bg) + 1
+    return speech.overlay(bg[: len(speech)])
+
+
+def as_segment(pcm: np.ndarray) -> AudioSegment:
+    return AudioSegment(
+        data=pcm.tobytes(), sample_width=2, frame_rate=SAMPLE_RATE, channels=1
+    )
+
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--encode", action="store_true")
+    args = parser.parse_args()
+
+    bg_pcm = bg_samples(BG_PATH, CACHE_DIR)
+    bg_seg = as_segment(bg_pcm)
+    rng = np.random.default_rng(0)
+
+    print(f"{'minutes':>7} {'pydub ms':>9} {'numpy ms':>9} {'speedup':>8}", end="")
+    print(f" {'encode ms':>10}" if args.encode else "")
+    for minutes in MINUTES:
+        speech_pcm = rng.integers(-8000, 8000, SAMPLE_RATE * 60 * minutes).astype(
+            np.int16
+        )
+        speech_seg = as_segment(speech_pcm)
+
+        t_pydub = best_of(lambda: pydub_mix(speech_seg, bg_seg), args.repeat)
+        t_numpy = best_of(lambda: mix_pcm(speech_pcm, bg_pcm), args.repeat)
+        line = (
+            f"{minutes:>7} {t_pydub * 1e3:>9.1f} {t_numpy * 1e3:>9.1f}"
+            f" {t_pydub / t_numpy:>7.1f}x"
+        )
+        if args.encode:
+            mixed = mix_pcm(speech_pcm, bg_pcm)
+            line += f" {best_of(lambda: encode_mp3(mixed), 1) * 1e3:>10.1f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
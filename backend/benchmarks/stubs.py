@@ -0,0 +1,328 @@
+# backend/benchmarks/stubs.py
+"""
+Local stand-ins for every service the backend talks to, in one server:
+
+  * PostgREST (/rest/v1/{table}): in-memory tables with the filters, order,
+    limit and single-object responses the app uses;
+  * Supabase Storage (/storage/v1): single-request and TUS uploads, bodies
+    are read and discarded;
+  * OpenAI (/v1/chat/completions, /v1/audio/speech);
+  * Gemini (/v1beta/models/{model}:generateContent / :streamGenerateContent,
+    /v1beta/cachedContents).
+
+Latencies and reply sizes come from the command line, so a run is
+reproducible and needs no network or API keys.
+
+    cd backend && python -m benchmarks.stubs --port 8900 [--llm-latency 0.05]
+
+Normally started by benchmarks.load_bench.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from dataclasses import dataclass
+from uuid import uuid4
+
+import uvicorn
+from benchmarks.digest_tokens import synthetic_logs
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+SAMPLE_RATE = 24_000  # OpenAI "pcm" speech: 24 kHz mono int16
+SCRIPT = (
+    "Close your eyes and breathe in slowly. [pause] Let your shoulders soften. "
+    "Notice the air as it leaves your body. [pause] You are here, and that is enough."
+)
+
+
+@dataclass
+class StubConfig:
+    llm_latency: float = 0.05  # seconds before a reply / the first token
+    token_delay: float = 0.005  # seconds between streamed tokens
+    tokens: int = 40  # tokens per chat reply
+    tts_latency: float = 0.05  # seconds per speech request
+    speech_secs_per_word: float = 0.35  # length of the returned PCM
+    db_latency: float = 0.002  # seconds per PostgREST request
+    storage_latency: float = 0.01  # seconds per storage request
+    users: int = 32  # users seeded with 15 days of logs
+
+
+def bench_user(i: int) -> str:
+    return f"00000000-0000-4000-8000-{i:012d}"
+
+
+class Tables:
+    """Just enough PostgREST semantics for the app's queries."""
+
+    OPS = {
+        "eq": lambda a, b: str(a) == b,
+        "neq": lambda a, b: str(a) != b,
+        "gt": lambda a, b: str(a) > b,
+        "gte": lambda a, b: str(a) >= b,
+        "lt": lambda a, b: str(a) < b,
+        "lte": lambda a, b: str(a) <= b,
+        "in": lambda a, b: str(a) in b.strip("()").split(","),
+        "is": lambda a, b: a is None if b == "null" else str(a).lower() == b,
+    }
+
+    def test(self, row: dict, column: str, expr: str) -> bool:
+        if column == "or":  # or=(col.op.value,col.op.value)
+            return any(
+                self.test(row, *term.split(".", 1))
+                for term in expr.strip("()").split(",")
+            )
+        op, _, value = expr.partition(".")
+        return self.OPS[op](row.get(column), value)
+
+    def __init__(self, users: int):
+        self.rows: dict[str, list[dict]] = {}
+        self.ids = itertools.count(1)
+        for i in range(users):
+            logs = synthetic_logs(per_day=3, seed=i)
+            for table, key in (
+                ("study_sessions", "study"),
+                ("sleep_logs", "sleep"),
+                ("mood_logs", "mood"),
+            ):
+                for row in logs[key]:
+                    self.table(table).append({**row, "user_id": bench_user(i)})
+
+    def table(self, name: str) -> list[dict]:
+        return self.rows.setdefault(name, [])
+
+    def match(self, name: str, params) -> tuple[list[dict], int]:
+        """Matching rows (after order/limit) and how many matched before limit."""
+        rows = self.table(name)
+        for column, expr in params.multi_items():
+            if column in ("select", "order", "limit", "offset", "columns"):
+                continue
+            rows = [r for r in rows if self.test(r, column, expr)]
+        if order := params.get("order"):
+            for part in reversed(order.split(",")):
+                column, _, direction = part.partition(".")
+                rows = sorted(
+                    rows,
+                    key=lambda r: (r.get(column) is None, r.get(column)),
+                    reverse=direction.startswith("desc"),
+                )
+        total = len(rows)
+        if limit := params.get("limit"):
+            rows = rows[: int(limit)]
+        return rows, total
+
+
+def build_app(config: StubConfig) -> Starlette:
+    tables = Tables(config.users)
+    uploads: dict[str, list[int]] = {}  # TUS id -> [offset, length]
+
+    async def postgrest(request: Request) -> Response:
+        await asyncio.sleep(config.db_latency)
+        name = request.path_params["table"]
+        if request.method == "POST":
+            payload = await request.json()
+            rows = payload if isinstance(payload, list) else [payload]
+            created = []
+            for row in rows:
+                row = {"id": next(tables.ids), "created_at": _now(), **row}
+                tables.table(name).append(row)
+                created.append(row)
+            return JSONResponse(created, status_code=201)
+
+        rows, total = tables.match(name, request.query_params)
+        if request.method == "PATCH":
+            changes = await request.json()
+            for row in rows:
+                row.update(changes)
+        elif request.method == "DELETE":
+            doomed = {id(r) for r in rows}
+            tables.rows[name] = [r for r in tables.table(name) if id(r) not in doomed]
+
+        if "vnd.pgrst.object" in request.headers.get("accept", ""):
+            if len(rows) != 1:
+                return JSONResponse(
+                    {
+                        "code": "PGRST116",
+                        "details": f"The result contains {len(rows)} rows",
+                        "hint": None,
+                        "message": "JSON object requested, multiple (or no) rows returned",
+                    },
+                    status_code=406,
+                )
+            return JSONResponse(rows[0])
+        headers = {}
+        if "count=exact" in request.headers.get("prefer", ""):
+            headers["Content-Range"] = f"0-{max(len(rows) - 1, 0)}/{total}"
+        return JSONResponse(rows, headers=headers)
+
+    async def storage_object(request: Request) -> Response:
+        await asyncio.sleep(config.storage_latency)
+        async for _ in request.stream():
+            pass
+        path = request.path_params["path"]
+        return JSONResponse({"Key": path, "Id": str(uuid4())})
+
+    async def tus_create(request: Request) -> Response:
+        upload_id = uuid4().hex
+        uploads[upload_id] = [0, int(request.headers["upload-length"])]
+        return Response(
+            status_code=201,
+            headers={"Location": f"/storage/v1/upload/resumable/{upload_id}"},
+        )
+
+    async def tus_upload(request: Request) -> Response:
+        state = uploads[request.path_params["upload_id"]]
+        if request.method == "HEAD":
+            return Response(headers={"Upload-Offset": str(state[0])})
+        await asyncio.sleep(config.storage_latency)
+        async for chunk in request.stream():
+            state[0] += len(chunk)
+        return Response(status_code=204, headers={"Upload-Offset": str(state[0])})
+
+    async def chat_completions(request: Request) -> Response:
+        body = await request.json()
+        prompt_tokens = sum(len(str(m["content"])) // 4 for m in body["messages"])
+        words = [f"word{i} " for i in range(config.tokens)]
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": config.tokens,
+            "total_tokens": prompt_tokens + config.tokens,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        head = {
+            "id": f"chatcmpl-{uuid4().hex}",
+            "created": int(time.time()),
+            "model": body["model"],
+        }
+        await asyncio.sleep(config.llm_latency)
+        if not body.get("stream"):
+            return JSONResponse(
+                {
+                    **head,
+                    "object": "chat.completion",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "".join(words)},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                }
+            )
+
+        async def events():
+            chunk = {**head, "object": "chat.completion.chunk"}
+            for word in words:
+                delta = {"index": 0, "delta": {"content": word}, "finish_reason": None}
+                yield f"data: {json.dumps({**chunk, 'choices': [delta]})}\n\n"
+                await asyncio.sleep(config.token_delay)
+            yield f"data: {json.dumps({**chunk, 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def speech(request: Request) -> Response:
+        body = await request.json()
+        await asyncio.sleep(config.tts_latency)
+        secs = len(body["input"].split()) * config.speech_secs_per_word
+        return Response(bytes(int(secs * SAMPLE_RATE) * 2), media_type="audio/pcm")
+
+    def gemini_payload(text: str, prompt_tokens: int) -> dict:
+        return {
+            "candidates": [
+                {
+                    "content": {"role": "model", "parts": [{"text": text}]},
+                    "finishReason": "STOP",
+                    "index": 0,
+                }
+            ],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": config.tokens,
+                "totalTokenCount": prompt_tokens + config.tokens,
+            },
+        }
+
+    async def gemini(request: Request) -> Response:
+        model, _, method = request.path_params["call"].partition(":")
+        body = await request.json()
+        prompt_tokens = len(json.dumps(body)) // 4
+        prompt = json.dumps(body.get("contents", ""))
+        # Meditation requests get a script with pauses, chat gets words.
+        if "meditation" in prompt.lower():
+            parts = [SCRIPT]
+        else:
+            parts = [f"word{i} " for i in range(config.tokens)]
+        await asyncio.sleep(config.llm_latency)
+        if method == "generateContent":
+            return JSONResponse(gemini_payload("".join(parts), prompt_tokens))
+
+        async def events():
+            for part in parts:
+                yield f"data: {json.dumps(gemini_payload(part, prompt_tokens))}\n\n"
+                await asyncio.sleep(config.token_delay)
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def cached_contents(request: Request) -> Response:
+        body = await request.json()
+        return JSONResponse(
+            {
+                "name": f"cachedContents/{uuid4().hex}",
+                "model": body.get("model"),
+                "expireTime": _now(),
+            }
+        )
+
+    return Starlette(
+        routes=[
+            Route(
+                "/rest/v1/{table}",
+                postgrest,
+                methods=["GET", "POST", "PATCH", "DELETE"],
+            ),
+            Route(
+                "/storage/v1/object/{path:path}",
+                storage_object,
+                methods=["POST", "DELETE"],
+            ),
+            Route("/storage/v1/upload/resumable", tus_create, methods=["POST"]),
+            Route(
+                "/storage/v1/upload/resumable/{upload_id}",
+                tus_upload,
+                methods=["PATCH", "HEAD"],
+            ),
+            Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+            Route("/v1/audio/speech", speech, methods=["POST"]),
+            Route("/v1beta/models/{call}", gemini, methods=["POST"]),
+            Route("/v1beta/cachedContents", cached_contents, methods=["POST"]),
+        ]
+    )
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8900)
+    defaults = StubConfig()
+    for field, value in vars(defaults).items():
+        parser.add_argument(
+            f"--{field.replace('_', '-')}", type=type(value), default=value
+        )
+    args = parser.parse_args()
+    config = StubConfig(**{k: v for k, v in vars(args).items() if k != "port"})
+    uvicorn.run(
+        build_app(config), host="127.0.0.1", port=args.port, log_level="warning"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# backend/tests/test_context_window.py
+import pytest
+from app.core.config import settings
+from app.services import context_window
+from app.services.context_window import build_window
+
+TURN = "x" * 36  # 10 estimated tokens + TURN_OVERHEAD = 14 per turn
+
+
+@pytest.fixture(autouse=True)
+def estimate_tokens(monkeypatch):
+    monkeypatch.setattr(context_window, "_encoding", None)
+    context_window.count_tokens.cache_clear()
+
+
+def session(turns: int, summarized: int = 0, base: int = 0) -> dict:
+    return {
+        "history": [
+            {"role": "user", "content": f"{TURN}{i:02d}"[-36:]} for i in range(turns)
+        ],
+        "history_base": base,
+        "summary": "earlier turns" if summarized else None,
+        "summarized": summarized,
+    }
+
+
+def test_folded_turns_are_not_resent_when_they_fit(monkeypatch):
+    monkeypatch.setitem(settings.CHAT_HISTORY_BUDGET, "openai", 10_000)
+    sess = session(6, summarized=4)
+
+    turns, summary = build_window(sess, "openai")
+
+    assert turns == sess["history"][4:]
+    assert summary == "earlier turns"
+
+
+def test_unfolded_turns_stay_until_summarized(monkeypatch):
+    monkeypatch.setitem(settings.CHAT_HISTORY_BUDGET, "openai", 50)  # 3 turns fit
+    monkeypatch.setattr(settings, "CHAT_SUMMARY_MIN_TURNS", 5)
+    sess = session(6)
+    assert context_window.window_start(sess["history"], "openai") == 3
+
+    turns, summary = build_window(sess, "openai")
+
+    assert turns == sess["history"]  # nothing folded yet, nothing dropped
+    assert summary is None
+
+
+def test_summarized_is_relative_to_the_loaded_turns(monkeypatch):
+    monkeypatch.setitem(settings.CHAT_HISTORY_BUDGET, "openai", 10_000)
+    sess = session(6, summarized=32, base=30)  # turns 30..35 loaded
+
+    turns, _ = build_window(sess, "openai")
+
+    assert turns == sess["history"][2:]
@@ -123,11 +123,12 @@ export const ChatSessionProvider = ({ children }: { children: React.ReactNode })
     setLogs(null);
   };
 
+  /* streams tokens from /chat/message/stream into the last agent bubble */
   const sendMessage = async (txt: string) => {
     if (!sessionId || !uid) return 'No session';
     setLoading(true);
     try {
-      const res = await authFetch('/chat/message', {
+      const res = await authFetch('/chat/message/stream', {
         method: 'POST',
         body: JSON.stringify({
           session_id: sessionId,
@@ -136,11 +137,35 @@ export const ChatSessionProvider = ({ children }: { children: React.ReactNode })
           model,
         }),
       });
-      if (!res.ok) throw new Error(await res.text());
-      const { reply } = await res.json();
-      setHistory((h) => [...h, { role: 'user', content: txt }, { role: 'agent', content: reply }]);
+      if (!res.ok || !res.body) throw new Error(await res.text());
+      setHistory((h) => [...h, { role: 'user', content: txt }, { role: 'agent', content: '' }]);
+
+      const setReply = (fn: (prev: string) => string) =>
+        setHistory((h) => [...h.slice(0, -1), { role: 'agent', content: fn(h[h.length - 1].content) }]);
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buf = '';
+      let failed: string | null = null;
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buf += decoder.decode(value, { stream: true });
+        const frames = buf.split('\n\n');
+        buf = frames.pop() ?? '';
+        for (const frame of frames) {
+          const event = frame.match(/^event: (.*)$/m)?.[1];
+          const data = frame.match(/^data: (.*)$/m)?.[1];
+          if (!data) continue;
+          const msg = JSON.parse(data);
+          if (event === 'done') setReply(() => msg.reply);
+          else if (event === 'error') failed = msg.detail;
+          else setReply((prev) => prev + msg.token);
+          setLoading(false);
+        }
+      }
       setLoading(false);
-      return null;
+      return failed;
     } catch (e: any) {
       setLoading(false);
       return e.message ?? 'Unknown error';
@@ -1,6 +1,7 @@
 // src/hooks/useLogs.ts
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { supabase } from '@/lib/supabaseClient';
+import { invalidateServerLogs } from '@/lib/logsCache';
 import { useAuth } from '@/context/AuthContext';
 
 function formatDateTime(dt: string) {
@@ -64,6 +65,7 @@ export function useDeleteLog() {
     },
     onSuccess: () => {
       queryClient.invalidateQueries({ queryKey: ['logs', user?.id] });
+      void invalidateServerLogs();
     },
   });
 }
@@ -0,0 +1,22 @@
+import { supabase } from './supabaseClient';
+
+const API_BASE = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+
+/**
+ * The backend caches each user's recent logs for a short while (chat session
+ * start, meditation prompt). Tell it to drop them after we write a new log.
+ * Fire-and-forget: a failure only means the cache expires on its own.
+ */
+export async function invalidateServerLogs() {
+  try {
+    const { data } = await supabase.auth.getSession();
+    const token = data.session?.access_token;
+    if (!token) return;
+    await fetch(`${API_BASE}/chat/logs/cache`, {
+      method: 'DELETE',
+      headers: { Authorization: `Bearer ${token}` },
+    });
+  } catch {
+    /* ignore */
+  }
+}
@@ -1,4 +1,5 @@
 import { supabase } from './supabaseClient';
+import { invalidateServerLogs } from './logsCache';
 import type { StudySession } from '../types/study';
 
 /** Fetch the current active session (ended_at: null) for a user */
@@ -55,4 +56,5 @@ export async function endSession(
     })
     .eq('id', id);
   if (error) throw new Error(error.message);
+  void invalidateServerLogs();
 }
\ No newline at end of file
@@ -1,4 +1,5 @@
 import { supabase } from './supabaseClient';
+import { invalidateServerLogs } from './logsCache';
 import type { StudySession } from '../types/study';
 
 /* ─────────────  STUDY  ──────────── */
@@ -40,6 +41,7 @@ export async function endSession(
     })
     .eq('id', id);
   if (error) throw new Error(error.message);
+  void invalidateServerLogs();
 }
 
 /* ─────────────  SLEEP / MOOD  ──────────── */
@@ -55,6 +57,7 @@ export async function insertSleep(score: number, note: string) {
      { user_id: user.id, date: today, score, note },
      { onConflict: 'user_id,date' },      // 1 row / user / day
    );
+  void invalidateServerLogs();
 }
 
 export async function insertMood(score: number, note: string) {
@@ -69,6 +72,7 @@ export async function insertMood(score: number, note: string) {
     score,
     note,
   });
+  void invalidateServerLogs();
 }
 
 export async function fetchAllLogs() {
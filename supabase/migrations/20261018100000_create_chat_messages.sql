@@ -0,0 +1,57 @@
+-- Append-only chat history: one row per turn instead of a JSON blob in
+-- chat_sessions.history. Appending is a constant-size insert and the last N
+-- turns of a session come from an index range scan.
+
+-- Messages reference their session, so session ids must be unique.
+alter table public.chat_sessions
+    add constraint chat_sessions_session_id_key unique (session_id);
+
+-- Deleting a session (or the user) deletes its messages.
+create table if not exists public.chat_messages (
+    id          bigint generated always as identity primary key,
+    session_id  uuid        not null
+                references public.chat_sessions (session_id) on delete cascade,
+    user_id     uuid        not null references auth.users (id) on delete cascade,
+    role        text        not null check (role in ('user', 'assistant')),
+    content     text        not null,
+    created_at  timestamptz not null default now()
+);
+
+-- "last N turns of a session" => ORDER BY id DESC LIMIT N on this index
+create index if not exists chat_messages_session_id_id_idx
+    on public.chat_messages (session_id, id);
+
+-- SessionStore.create() wipes a user's previous session
+create index if not exists chat_messages_user_id_idx
+    on public.chat_messages (user_id);
+
+alter table public.chat_messages enable row level security;
+
+-- Backfill: explode existing history blobs into rows, preserving order.
+-- The blob was written with json.dumps(), so depending on the column type it
+-- may be a JSON array or a JSON string containing one; handle both.
+with blobs as (
+    select
+        s.session_id,
+        s.user_id,
+        case jsonb_typeof(s.history::jsonb)
+            when 'string' then (s.history::jsonb #>> '{}')::jsonb
+            else s.history::jsonb
+        end as history
+    from public.chat_sessions s
+    where s.history is not null
+      and not exists (
+          select 1 from public.chat_messages m
+          where m.session_id = s.session_id
+      )
+)
+insert into public.chat_messages (session_id, user_id, role, content)
+select b.session_id, b.user_id, t.msg ->> 'role', t.msg ->> 'content'
+from blobs b
+cross join lateral jsonb_array_elements(b.history) with ordinality as t(msg, n)
+where jsonb_typeof(b.history) = 'array'
+order by b.session_id, t.n;
+
+-- Blobs are now redundant; the app keeps writing '[]' for compatibility and
+-- migrates any blob it still finds on first read.
+update public.chat_sessions set history = '[]' where history is not null;
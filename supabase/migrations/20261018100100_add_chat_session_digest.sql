@@ -0,0 +1,6 @@
+-- Compact log summary (app/services/log_digest.py) computed once when a chat
+-- session starts and reused for every prompt in that session.
+-- Nullable: older sessions get a digest computed on first read.
+
+alter table public.chat_sessions
+    add column if not exists digest text;
@@ -0,0 +1,8 @@
+-- Provider-side cache of the session context (Gemini cached content):
+-- {"name": "cachedContents/...", "expires_at": <unix seconds>}.
+-- Set in the background after /chat/session; null when no cache was
+-- registered (context too small, caching off), and turns then send the
+-- context inline.
+
+alter table public.chat_sessions
+    add column if not exists context_cache jsonb;
@@ -0,0 +1,8 @@
+-- Rolling summary of the turns that no longer fit a prompt's token budget
+-- (app/services/context_window.py). `summarized` is how many leading turns
+-- of chat_messages (ordered by id) the summary covers, so each fold only
+-- summarizes what dropped out since the previous one.
+
+alter table public.chat_sessions
+    add column if not exists summary text,
+    add column if not exists summarized integer not null default 0;
@@ -0,0 +1,8 @@
+-- Claim on moving a legacy chat_sessions.history blob into chat_messages
+-- (app/services/supabase_client.py migrate_history_blob). Set while one
+-- request inserts the rows; the blob itself is only cleared afterwards, so
+-- other reads keep seeing it. A claim older than CHAT_MIGRATION_LEASE is
+-- treated as abandoned.
+
+alter table public.chat_sessions
+    add column if not exists history_migrating_at timestamptz;